@@ -1,12 +1,20 @@
 import traceback
 
-from flask import Flask, jsonify, redirect
+from flask import Flask, g, jsonify, redirect, request
 from flasgger import Swagger
 from app.routes.wol import wol_bp
 from app.routes.pub_w import pub_w_bp
 from app.routes.pub_mwb import pub_mwb_bp
+from app.routes.status import status_bp
+from app.routes.metrics import metrics_bp
+from app.routes.archive import archive_bp
+from app.services.cache import set_cache_bypass
+from app.services.constants import Constants
+from app.services.metrics import start_request_metrics, finish_request_metrics
+from app.services.warmer import start_warmer
 import logging
 import os
+import time
 
 
 def create_app():
@@ -16,6 +24,9 @@ def create_app():
     app.register_blueprint(wol_bp, url_prefix='/wol')
     app.register_blueprint(pub_w_bp, url_prefix='/pub-w')
     app.register_blueprint(pub_mwb_bp, url_prefix='/pub-mwb')
+    app.register_blueprint(status_bp, url_prefix='/status')
+    app.register_blueprint(archive_bp, url_prefix='/archive')
+    app.register_blueprint(metrics_bp)
 
     log_level = os.getenv('LOGGING_LEVEL', 'INFO').upper()
     numeric_level = getattr(logging, log_level, logging.INFO)
@@ -23,6 +34,46 @@ def create_app():
     logger = logging.getLogger(__name__)
     logger.info('Flask app initialized')
 
+    if Constants.WARMER_ENABLED:
+        start_warmer()
+
+    @app.before_request
+    def start_metrics():
+        g.metrics_start_time = time.perf_counter()
+        g.reference_counter = start_request_metrics()
+
+    @app.before_request
+    def apply_cache_bypass():
+        # `?cache=bypass` skips every cache lookup of this request (the in-process caches, the shared response store
+        # and the archive), so it costs a full upstream fan-out. `Cache-Control: no-cache` is deliberately ignored:
+        # browsers send it on every hard reload.
+        set_cache_bypass(request.args.get('cache') == 'bypass')
+
+    @app.after_request
+    def add_json_etag(response):
+        # Lets clients polling the JSON endpoints revalidate with If-None-Match and get a cheap 304
+        if request.method in ('GET', 'HEAD') and response.status_code == 200 and response.is_json \
+                and not response.is_streamed:
+            response.add_etag()
+            response = response.make_conditional(request)
+        return response
+
+    @app.after_request
+    def record_metrics(response):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        counter, start_time, method = g.reference_counter, g.metrics_start_time, request.method
+
+        def finish():
+            finish_request_metrics(counter, endpoint, method, response.status_code,
+                                   time.perf_counter() - start_time)
+
+        # Streamed bodies keep resolving references after the view returns
+        if response.is_streamed:
+            response.call_on_close(finish)
+        else:
+            finish()
+        return response
+
     @app.errorhandler(Exception)
     def handle_exception(e):
         logger.error(f"An unexpected error occurred: {str(e)}")
@@ -0,0 +1,122 @@
+import logging
+from datetime import date, timedelta
+
+from flask import Blueprint, Response, jsonify, request
+
+from app.services.archive import week_archive
+from app.services.constants import Constants
+
+archive_bp = Blueprint('archive', __name__)
+logger = logging.getLogger('archive')
+
+PUBLICATIONS = (Constants.PUB_CODE_WATCHTOWER, Constants.PUB_CODE_MEETING_WORKBOOK)
+
+
+def _monday(value: str) -> date | None:
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        return None
+    return day - timedelta(days=day.weekday())
+
+
+@archive_bp.route('/weeks', methods=['GET'])
+def list_archived_weeks() -> tuple[Response, int]:
+    """
+    List the weeks held in the archive, without going upstream
+    ---
+    parameters:
+      - name: publication
+        in: query
+        type: string
+        enum: [pub-w, pub-mwb]
+        required: false
+      - name: language
+        in: query
+        type: string
+        required: false
+        description: Language code of the week's pages, e.g. es
+      - name: from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Only weeks overlapping or after this day (YYYY-MM-DD)
+      - name: to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Only weeks starting on or before this day (YYYY-MM-DD)
+    responses:
+      200:
+        description: The archived weeks with their source URL and hash, oldest first
+      400:
+        description: Invalid input
+      404:
+        description: The archive is disabled
+    """
+    if week_archive is None:
+        return jsonify({'error': 'The archive is disabled'}), 404
+
+    publication = request.args.get('publication')
+    if publication is not None and publication not in PUBLICATIONS:
+        return jsonify({'error': f'publication must be one of {list(PUBLICATIONS)}'}), 400
+
+    bounds = {}
+    for name in ('from', 'to'):
+        value = request.args.get(name)
+        if value is None:
+            continue
+        monday = _monday(value)
+        if monday is None:
+            return jsonify({'error': f'{name} must be a date in YYYY-MM-DD format'}), 400
+        bounds[name] = monday.isoformat()
+
+    weeks = week_archive.list_weeks(publication=publication, language=request.args.get('language'),
+                                    start=bounds.get('from'), end=bounds.get('to'))
+    return jsonify({'weeks': weeks}), 200
+
+
+@archive_bp.route('/<publication>/<week>', methods=['GET'])
+def get_archived_week(publication: str, week: str) -> tuple[Response, int]:
+    """
+    Return the archived JSON of a week, without going upstream
+    ---
+    parameters:
+      - name: publication
+        in: path
+        type: string
+        enum: [pub-w, pub-mwb]
+        required: true
+      - name: week
+        in: path
+        type: string
+        format: date
+        required: true
+        description: Any day of the week (YYYY-MM-DD)
+      - name: language
+        in: query
+        type: string
+        required: false
+        default: es
+    responses:
+      200:
+        description: The archived entry, with the parsed JSON under `payload`
+      400:
+        description: Invalid input
+      404:
+        description: The week is not archived, or the archive is disabled
+    """
+    if week_archive is None:
+        return jsonify({'error': 'The archive is disabled'}), 404
+    if publication not in PUBLICATIONS:
+        return jsonify({'error': f'publication must be one of {list(PUBLICATIONS)}'}), 400
+    monday = _monday(week)
+    if monday is None:
+        return jsonify({'error': 'week must be a date in YYYY-MM-DD format'}), 400
+
+    entry = week_archive.get(publication, monday.isoformat(), request.args.get('language', 'es'))
+    if entry is None:
+        return jsonify({'error': f'{publication} for the week of {monday.isoformat()} is not archived'}), 404
+    return jsonify(entry), 200
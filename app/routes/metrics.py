@@ -0,0 +1,21 @@
+from flask import Blueprint, Response
+
+from app.services.metrics import render_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics() -> Response:
+    """
+    Expose upstream fetch, parser, reference and cache metrics in the Prometheus text format, aggregated over every
+    gunicorn worker
+    ---
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: The metrics of all workers
+    """
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
@@ -1,11 +1,13 @@
 import logging
 
-from flask import Blueprint, Response, jsonify, request
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
 
-from app.routes.wol import fetch_today
-from app.services.fetch_content import is_valid_wol_bible_book_url, is_url_str_in_wol_jw_org, get_html_content
-from app.services.pub_mwb_parser import parse_10min_talk_to_json, parse_weekly_bible_read, \
-    extract_references_from_links, parse_meeting_workbook_to_json
+from app.services.fetch_content import is_valid_wol_bible_book_url, is_url_str_in_wol_jw_org, \
+    fetch_today_document_from_landing
+from app.services.pub_mwb_parser import parse_10min_talk_from_soup, iter_references_from_links
+from app.services.reference_link_parser import ReferenceBatch
+from app.services.weekly_payloads import get_week_program_json, get_week_program_json_for_url, \
+    get_weekly_scripture_read, get_scripture_read_references, resolve_week_sources, get_weeks_program_json
 
 pub_mwb_bp = Blueprint('pub_mwb', __name__)
 logger = logging.getLogger('pub_mwb')
@@ -22,12 +24,12 @@ def get_this_week_html() -> tuple[Response, int] | tuple[str, int]:
       404:
         description: Resource not found
     """
-    today_html_content, status_code = fetch_today()
+    today_document, status_code = fetch_today_document_from_landing()
     if status_code != 200:
-        return jsonify({'error': today_html_content}), status_code
+        return jsonify({'error': today_document}), status_code
 
     logger.info('Processing HTML content.')
-    json_data = parse_10min_talk_to_json(today_html_content)
+    json_data = parse_10min_talk_from_soup(today_document.soup)
     logger.info('Successfully parsed HTML to JSON.')
 
     return jsonify(json_data), 200
@@ -56,30 +58,69 @@ def get_this_week_json() -> tuple[Response, int] | tuple[str, int]:
 
     if is_url_str_in_wol_jw_org(url):
         logger.info('Fetching HTML content from provided URL')
-        html_content, status_code = get_html_content(url)
+        json_data, status_code = get_week_program_json_for_url(url)
     else:
         logger.info('Fetching today\'s data')
-        html_content, status_code = fetch_today()
+        json_data, status_code = get_week_program_json()
 
     if status_code != 200:
         logger.error('Failed to fetch data with status code %s', status_code)
-        return jsonify({'error': html_content}), status_code
+        return jsonify({'error': json_data}), status_code
 
-    logger.info('Parsing JSON data')
-    json_data = parse_meeting_workbook_to_json(html_content)
     logger.info('Successfully parsed JSON data')
     return jsonify(json_data), 200
 
 
+@pub_mwb_bp.route('/get-weeks-program-json', methods=['GET'])
+def get_weeks_program() -> tuple[Response, int]:
+    """
+    Fetch the program of several weeks from WOL in parallel and return them as JSON. Tooltips cited by several weeks
+    are only fetched once.
+    ---
+    parameters:
+      - name: from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: First day of the range (YYYY-MM-DD); every week overlapping the range is returned.
+      - name: to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Last day of the range (YYYY-MM-DD). Defaults to `from`.
+      - name: urls
+        in: query
+        type: array
+        items:
+          type: string
+        collectionFormat: multi
+        required: false
+        description: Week URLs to fetch instead of a date range, e.g. https://wol.jw.org/es/wol/h/r4/lp-s/2024/6/10
+    responses:
+      200:
+        description: >
+          {"weeks": [{"week", "url", "status", "result" | "error"}, ...], "fetchStats": {...}}, one entry per week in
+          order
+      400:
+        description: Invalid input or too many weeks (see WEEK_BATCH_MAX_WEEKS)
+    """
+    sources, status_code = resolve_week_sources(request.args.get('from'), request.args.get('to'),
+                                                request.args.getlist('urls'))
+    if status_code != 200:
+        return jsonify({'error': sources}), status_code
+
+    logger.info(f'Fetching the program of {len(sources)} weeks')
+    return jsonify(get_weeks_program_json(sources)), 200
+
+
 def fetch_weekly_bible_reading_info() -> tuple[dict, int]:
-    today_html_content, status_code = fetch_today()
+    json_data, status_code = get_weekly_scripture_read()
     if status_code != 200:
-        return {'error': today_html_content}, status_code
+        return {'error': json_data}, status_code
 
-    logger.info('Processing HTML content.')
-    json_data = parse_weekly_bible_read(today_html_content)
     logger.info('Successfully parsed HTML to JSON.')
-
     return json_data, 200
 
 
@@ -127,6 +168,14 @@ def get_bible_references_as_json() -> tuple[Response, int] | tuple[str, int]:
           type: string
         collectionFormat: multi
         example: ["https://wol.jw.org/es/wol/b/r4/lp-s/nwtsty/19/70", "https://wol.jw.org/es/wol/b/r4/lp-s/nwtsty/19/71"]
+      - in: query
+        name: stream
+        required: false
+        type: string
+        enum: [ndjson]
+        description: >
+          Stream one JSON object per line as each chapter finishes ({"type": "result" | "error", "index": <position
+          of the link>, ...}), followed by a final {"type": "fetchStats", ...} line.
     responses:
       200:
         description: The JSON content of the Bible references
@@ -149,6 +198,18 @@ def get_bible_references_as_json() -> tuple[Response, int] | tuple[str, int]:
     if invalid_links:
         return jsonify({'error': 'Some links are invalid', 'invalid_links': invalid_links}), 400
 
-    bible_references = extract_references_from_links(links)
+    if request.args.get('stream') == 'ndjson':
+        return Response(stream_with_context(stream_references_as_ndjson(links)), mimetype='application/x-ndjson'), 200
+
+    bible_references, status_code = get_scripture_read_references(links)
+
+    return jsonify(bible_references), status_code
+
 
-    return jsonify(bible_references), 200
+def stream_references_as_ndjson(links: list[str]):
+    batch = ReferenceBatch()
+    # Each chapter is written out as soon as it completes, so the batch only keeps the references of those in flight
+    for index, kind, outcome in iter_references_from_links(links, batch, in_flight_only=True):
+        logger.debug(f'Streaming {kind} for link {index}')
+        yield current_app.json.dumps({'type': kind, 'index': index, **outcome}) + '\n'
+    yield current_app.json.dumps({'type': 'fetchStats', **batch.stats()}) + '\n'
@@ -3,8 +3,9 @@ import time
 
 from flask import Blueprint, Response, jsonify, request
 
-from app.services.fetch_content import fetch_landing_html, fetch_today_html, fetch_weekly_html
+from app.services.fetch_content import fetch_weekly_document_from_landing
 from app.services.pub_w_parser import parse_html_to_json
+from app.services.weekly_payloads import get_pub_w_week_json, resolve_week_sources, get_pub_w_weeks_json
 
 pub_w_bp = Blueprint('pub_w', __name__)
 logger = logging.getLogger('pub_w')
@@ -22,17 +23,11 @@ def get_this_week_html() -> tuple[Response, int] | tuple[str, int]:
         description: Resource not found
     """
     start_time = time.time()
-    html_content, status_code = fetch_landing_html()
-    if status_code != 200:
-        return jsonify({'error': html_content}), status_code
-    today_html_content, status_code = fetch_today_html(html_content)
-    if status_code != 200:
-        return jsonify({'error': today_html_content}), status_code
-    weekly_html_content, status_code = fetch_weekly_html(today_html_content)
+    weekly_document, status_code = fetch_weekly_document_from_landing()
     logger.info(f'fetch_weekly_html completed in {time.time() - start_time:.2f} seconds')
     if status_code != 200:
-        return jsonify({'error': weekly_html_content}), status_code
-    return weekly_html_content, status_code
+        return jsonify({'error': weekly_document}), status_code
+    return weekly_document.html, status_code
 
 
 @pub_w_bp.route('/html-to-json', methods=['POST'])
@@ -74,8 +69,53 @@ def get_this_week_json() -> tuple[Response, int] | tuple[str, int]:
       404:
         description: Resource not found
     """
-    html_content, status_code = get_this_week_html()
+    json_data, status_code = get_pub_w_week_json()
     if status_code != 200:
-        return jsonify({'error': html_content}), status_code
-    json_data = parse_html_to_json(html_content)
+        return jsonify({'error': json_data}), status_code
     return jsonify(json_data), 200
+
+
+@pub_w_bp.route('/get-weeks-json', methods=['GET'])
+def get_weeks_json() -> tuple[Response, int]:
+    """
+    Fetch the W study articles of several weeks from WOL in parallel and return them as JSON. Tooltips cited by
+    several weeks are only fetched once.
+    ---
+    parameters:
+      - name: from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: First day of the range (YYYY-MM-DD); every week overlapping the range is returned.
+      - name: to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Last day of the range (YYYY-MM-DD). Defaults to `from`.
+      - name: urls
+        in: query
+        type: array
+        items:
+          type: string
+        collectionFormat: multi
+        required: false
+        description: >
+          Week URLs to fetch instead of a date range: today pages (e.g. https://wol.jw.org/es/wol/h/r4/lp-s/2024/6/10)
+          or the study articles themselves
+    responses:
+      200:
+        description: >
+          {"weeks": [{"week", "url", "status", "result" | "error"}, ...], "fetchStats": {...}}, one entry per week in
+          order
+      400:
+        description: Invalid input or too many weeks (see WEEK_BATCH_MAX_WEEKS)
+    """
+    sources, status_code = resolve_week_sources(request.args.get('from'), request.args.get('to'),
+                                                request.args.getlist('urls'))
+    if status_code != 200:
+        return jsonify({'error': sources}), status_code
+
+    logger.info(f'Fetching the W articles of {len(sources)} weeks')
+    return jsonify(get_pub_w_weeks_json(sources)), 200
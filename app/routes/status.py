@@ -0,0 +1,156 @@
+import hmac
+import logging
+from functools import wraps
+
+from flask import Blueprint, Response, jsonify, request
+
+from app.services.cache import get_cache_stats, clear_cache, is_invalidation_shared
+from app.services.constants import Constants
+from app.services.hedging import latency_tracker
+from app.services.http_client import upstream_limiter
+from app.services.response_store import response_store
+from app.services.upstream_guard import get_breaker_stats
+from app.services.warmer import get_warmer_status
+
+status_bp = Blueprint('status', __name__)
+logger = logging.getLogger('status')
+
+
+def require_admin_token(view):
+    """
+    Lets a request through only with `Authorization: Bearer <STATUS_ADMIN_TOKEN>`; without a configured token the
+    endpoint is disabled.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not Constants.STATUS_ADMIN_TOKEN:
+            return jsonify({'error': 'Set STATUS_ADMIN_TOKEN to enable this endpoint'}), 403
+        expected = f'Bearer {Constants.STATUS_ADMIN_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+            return jsonify({'error': 'Missing or invalid admin token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@status_bp.route('/cache', methods=['GET'])
+def cache_stats() -> tuple[Response, int]:
+    """
+    Report the hit/miss/eviction counters of this worker's in-process caches
+    ---
+    responses:
+      200:
+        description: The counters of every cache, keyed by cache name
+    """
+    return jsonify(get_cache_stats()), 200
+
+
+@status_bp.route('/cache/<name>', methods=['DELETE'])
+@require_admin_token
+def invalidate_cache(name: str) -> tuple[Response, int]:
+    """
+    Drop every entry of one of the in-process caches (e.g. `navigation` after WOL publishes early), in every worker
+    ---
+    parameters:
+      - name: name
+        in: path
+        type: string
+        required: true
+        description: The cache to invalidate, as listed by /status/cache.
+      - name: Authorization
+        in: header
+        type: string
+        required: true
+        description: Bearer STATUS_ADMIN_TOKEN
+    responses:
+      200:
+        description: The cache was cleared. `scope` is `all-workers` when the other workers follow within
+          CACHE_GENERATION_CHECK_INTERVAL, or `worker` when CACHE_GENERATION_DIR is empty and only the worker that
+          served the request was cleared
+      401:
+        description: Missing or invalid admin token
+      403:
+        description: STATUS_ADMIN_TOKEN is not set
+      404:
+        description: Unknown cache
+    """
+    if not clear_cache(name):
+        return jsonify({'error': f'Unknown cache: {name}'}), 404
+    scope = 'all-workers' if is_invalidation_shared() else 'worker'
+    logger.info(f'Cache {name} invalidated on request ({scope})')
+    return jsonify({'cleared': name, 'scope': scope}), 200
+
+
+@status_bp.route('/response-store', methods=['GET'])
+def response_store_stats() -> tuple[Response, int]:
+    """
+    Report the size and per URL class entries of the upstream response store shared by all workers
+    ---
+    responses:
+      200:
+        description: Stored bytes, the size bound, the TTL of every URL class and its entries (fresh and total)
+      404:
+        description: The response store is disabled
+    """
+    if response_store is None:
+        return jsonify({'error': 'The response store is disabled'}), 404
+    return jsonify(response_store.stats()), 200
+
+
+@status_bp.route('/response-store', methods=['DELETE'])
+@require_admin_token
+def clear_response_store() -> tuple[Response, int]:
+    """
+    Drop every stored upstream response, for all workers
+    ---
+    parameters:
+      - name: Authorization
+        in: header
+        type: string
+        required: true
+        description: Bearer STATUS_ADMIN_TOKEN
+    responses:
+      200:
+        description: The response store was cleared
+      401:
+        description: Missing or invalid admin token
+      403:
+        description: STATUS_ADMIN_TOKEN is not set
+      404:
+        description: The response store is disabled
+    """
+    if response_store is None:
+        return jsonify({'error': 'The response store is disabled'}), 404
+    response_store.clear()
+    logger.info('Response store cleared on request')
+    return jsonify({'cleared': 'response-store'}), 200
+
+
+@status_bp.route('/upstream', methods=['GET'])
+def upstream_status() -> tuple[Response, int]:
+    """
+    Report this worker's adaptive upstream concurrency window, hedge delays and circuit breakers
+    ---
+    responses:
+      200:
+        description: The current window and its bounds, requests in flight and queued, any Retry-After hold left, the
+          baseline latency per URL class, how often the window grew, shrank or was throttled, and the current hedge
+          delay per URL class (null until enough latencies were seen), and the state, recent fetches and failures,
+          openings and rejected fetches of the circuit breaker of each upstream host
+    """
+    return jsonify({
+        **upstream_limiter.stats(),
+        'hedgeDelays': latency_tracker.delays(),
+        'circuitBreakers': get_breaker_stats(),
+    }), 200
+
+
+@status_bp.route('/warmer', methods=['GET'])
+def warmer_status() -> tuple[Response, int]:
+    """
+    Report the state of this worker's payload warmer and the timings of its last run
+    ---
+    responses:
+      200:
+        description: Whether the warmer is enabled, its schedule, next run and last run timings per payload
+    """
+    return jsonify(get_warmer_status()), 200
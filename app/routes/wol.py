@@ -3,7 +3,7 @@ import time
 
 from flask import Blueprint, Response, jsonify
 
-from app.services.fetch_content import fetch_landing_html, fetch_today_html
+from app.services.fetch_content import fetch_landing_html, fetch_today_document_from_landing
 
 wol_bp = Blueprint('wol', __name__)
 logger = logging.getLogger('pub_w')
@@ -40,11 +40,8 @@ def fetch_today() -> tuple[Response, int] | tuple[str, int]:
         description: Resource not found
     """
     start_time = time.time()
-    html_content, status_code = fetch_landing_html()
-    if status_code != 200:
-        return jsonify({'error': html_content}), status_code
-    today_html_content, status_code = fetch_today_html(html_content)
+    today_document, status_code = fetch_today_document_from_landing()
     logger.info(f'fetch_today_html completed in {time.time() - start_time:.2f} seconds')
     if status_code != 200:
-        return jsonify({'error': today_html_content}), status_code
-    return today_html_content, status_code
+        return jsonify({'error': today_document}), status_code
+    return today_document.html, status_code
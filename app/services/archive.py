@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import date
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from app.services.cache import is_cache_bypassed
+from app.services.constants import Constants
+from app.services.fetch_content import end_of_week
+from app.services.metrics import record_cache_lookup
+from app.services.reference_link_parser import track_unresolved_references
+
+logger = logging.getLogger('archive')
+
+# Bump whenever a parser's output changes, so archived payloads are re-parsed instead of served. Version 2 drops the
+# payloads archived with unresolved references before those were kept out of the archive.
+PARSER_VERSION = 2
+
+ARCHIVE_CACHE_NAME = 'archive'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parsed_weeks (
+    publication TEXT NOT NULL,
+    week TEXT NOT NULL,
+    language TEXT NOT NULL,
+    source_url TEXT NOT NULL,
+    source_hash TEXT NOT NULL,
+    parser_version INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    checked_at REAL NOT NULL,
+    PRIMARY KEY (publication, week, language)
+)
+"""
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class WeekArchive:
+    """
+    SQLite store of parsed weekly payloads keyed by publication, week (its Monday) and language, with the hash of the
+    source they were parsed from. The database runs in WAL mode so every gunicorn worker can read while one writes.
+    """
+
+    def __init__(self, path: str, refresh_interval: float):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            # sqlite3 cannot create the file in a missing directory (e.g. the gitignored data/ of a fresh checkout)
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute(SCHEMA)
+                    connection.commit()
+                    self._initialized = True
+        return connection
+
+    def is_fresh(self, entry: Dict[str, Any], now: float | None = None) -> bool:
+        """
+        A published week never changes, so entries of weeks that are over stay fresh; the current and upcoming weeks
+        are re-checked against the source every refresh_interval seconds.
+        """
+        if entry['parserVersion'] != PARSER_VERSION:
+            return False
+        now = time.time() if now is None else now
+        if end_of_week(date.fromisoformat(entry['week'])) <= now:
+            return True
+        return now - entry['checkedAt'] < self.refresh_interval
+
+    def get(self, publication: str, week: str, language: str) -> Dict[str, Any] | None:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                'SELECT * FROM parsed_weeks WHERE publication = ? AND week = ? AND language = ?',
+                (publication, week, language),
+            ).fetchone()
+        return _row_to_entry(row) if row else None
+
+    def put(self, publication: str, week: str, language: str, source_url: str, source_hash: str,
+            payload: Any) -> None:
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                'INSERT INTO parsed_weeks (publication, week, language, source_url, source_hash, parser_version, '
+                'payload, created_at, checked_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (publication, week, language) DO UPDATE SET source_url = excluded.source_url, '
+                'source_hash = excluded.source_hash, parser_version = excluded.parser_version, '
+                'payload = excluded.payload, created_at = excluded.created_at, checked_at = excluded.checked_at',
+                (publication, week, language, source_url, source_hash, PARSER_VERSION, json.dumps(payload), now, now),
+            )
+
+    def touch(self, publication: str, week: str, language: str) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                'UPDATE parsed_weeks SET checked_at = ? WHERE publication = ? AND week = ? AND language = ?',
+                (time.time(), publication, week, language),
+            )
+
+    def list_weeks(self, publication: str | None = None, language: str | None = None, start: str | None = None,
+                   end: str | None = None) -> List[Dict[str, Any]]:
+        """
+        Lists archived weeks (without their payloads), oldest first, optionally filtered by publication, language and
+        an inclusive range of week Mondays.
+        """
+        clauses, params = [], []
+        for column, operator, value in (('publication', '=', publication), ('language', '=', language),
+                                        ('week', '>=', start), ('week', '<=', end)):
+            if value is not None:
+                clauses.append(f'{column} {operator} ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                'SELECT publication, week, language, source_url, source_hash, parser_version, created_at, checked_at '
+                f'FROM parsed_weeks {where} ORDER BY week, publication, language',
+                params,
+            ).fetchall()
+        return [_row_to_entry(row) for row in rows]
+
+
+def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+    entry = {
+        'publication': row['publication'],
+        'week': row['week'],
+        'language': row['language'],
+        'sourceUrl': row['source_url'],
+        'sourceHash': row['source_hash'],
+        'parserVersion': row['parser_version'],
+        'createdAt': row['created_at'],
+        'checkedAt': row['checked_at'],
+    }
+    if 'payload' in row.keys():
+        entry['payload'] = json.loads(row['payload'])
+    return entry
+
+
+week_archive = WeekArchive(Constants.ARCHIVE_PATH, Constants.ARCHIVE_REFRESH_INTERVAL) \
+    if Constants.ARCHIVE_PATH else None
+
+
+def archived_payload(publication: str, week: str | None, language: str) -> Dict[str, Any] | None:
+    """
+    Returns the archived entry of a week when it is fresh enough to serve without going upstream. Lookups are
+    skipped while the `archive` cache is bypassed, and for payloads that are not tied to a week.
+    """
+    if week_archive is None or week is None:
+        return None
+    if is_cache_bypassed(ARCHIVE_CACHE_NAME):
+        record_cache_lookup(ARCHIVE_CACHE_NAME, 'bypass')
+        return None
+    try:
+        entry = week_archive.get(publication, week, language)
+    except sqlite3.Error as e:
+        logger.error(f'Unable to read the archive: {e}')
+        return None
+    if entry is None or not week_archive.is_fresh(entry):
+        record_cache_lookup(ARCHIVE_CACHE_NAME, 'miss')
+        return None
+    record_cache_lookup(ARCHIVE_CACHE_NAME, 'hit')
+    return entry
+
+
+def archive_or_reuse(publication: str, week: str | None, language: str, source_url: str, source: str,
+                     parse: Callable[[], Any]) -> Any:
+    """
+    Parses source with parse() and archives the result, unless the archive already holds a payload parsed from the
+    very same source by the current parsers, which is returned instead (and marked as checked). A payload with
+    references that could not be resolved (e.g. after a timeout or with the upstream circuit open) is returned but not
+    archived, so the next refresh parses the source again instead of reusing it.
+    """
+    if week_archive is None or week is None:
+        return parse()
+
+    source_hash = content_hash(source)
+    try:
+        entry = None if is_cache_bypassed(ARCHIVE_CACHE_NAME) else week_archive.get(publication, week, language)
+        if entry is not None and entry['sourceHash'] == source_hash and entry['parserVersion'] == PARSER_VERSION:
+            logger.info(f'Source of {publication} {week} ({language}) unchanged, reusing the archived payload')
+            week_archive.touch(publication, week, language)
+            return entry['payload']
+    except sqlite3.Error as e:
+        logger.error(f'Unable to read the archive: {e}')
+
+    with track_unresolved_references() as unresolved:
+        payload = parse()
+    if unresolved.count:
+        logger.warning(f'{publication} {week} ({language}) has {unresolved.count} unresolved references, '
+                       f'not archiving it')
+        return payload
+    try:
+        week_archive.put(publication, week, language, source_url, source_hash, payload)
+    except sqlite3.Error as e:
+        logger.error(f'Unable to archive {publication} {week} ({language}): {e}')
+    return payload
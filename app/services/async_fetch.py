@@ -0,0 +1,226 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import AsyncIterator, Coroutine, Any, Dict, Iterator, List
+
+import httpx
+
+from app.services.cache import MISSING
+from app.services.conditional_requests import conditional_headers, remember_response, revalidated_body
+from app.services.constants import Constants
+from app.services.hedging import call_with_retries_async
+from app.services.http_client import DEFAULT_HEADERS, upstream_limiter
+from app.services.metrics import classify_url, record_coalesced_request, record_upstream_request
+from app.services.response_store import fresh_response
+from app.services.upstream_guard import cached_failure, guarded_fetch_async
+
+logger = logging.getLogger('async_fetch')
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_pid: int | None = None
+_loop_lock = threading.Lock()
+_client: httpx.AsyncClient | None = None
+_in_flight: Dict[str, asyncio.Future] = {}
+
+# Same policy as fetch_content.RETRYABLE_EXCEPTIONS: only failures where the request most likely never reached WOL
+RETRYABLE_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop) -> None:
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns this worker's fetch event loop, started on a daemon thread on first use (and again after a fork).
+    """
+    global _loop, _loop_pid, _client
+
+    pid = os.getpid()
+    if _loop is not None and _loop_pid == pid:
+        return _loop
+
+    with _loop_lock:
+        if _loop is None or _loop_pid != pid:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=_run_loop, args=(loop,), name='async-fetch-loop', daemon=True).start()
+            _client = None
+            _in_flight.clear()
+            _loop = loop
+            _loop_pid = pid
+            logger.info(f"Started async fetch loop for pid {pid}")
+    return _loop
+
+
+def _get_client() -> httpx.AsyncClient:
+    # Only called from coroutines running on the fetch loop, so no locking is needed
+    global _client
+
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(27, connect=6.05),
+            limits=httpx.Limits(max_connections=Constants.HTTP_POOL_MAXSIZE,
+                                max_keepalive_connections=Constants.HTTP_POOL_MAXSIZE),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def get_html_content_async(url: str) -> tuple[str, int]:
+    """
+    Async counterpart of fetch_content.get_html_content, with the same return values and error statuses.
+
+    Recent client errors come from the negative cache, an open circuit fails fast, and bodies still fresh in the
+    shared response store are served from it. Concurrent calls for the same URL on this worker's loop share a single
+    upstream request.
+
+    Args:
+    url (str): The URL to send the request to.
+
+    Returns:
+    tuple[str, int]: A tuple containing the HTML content and the HTTP status code.
+    """
+    failure = cached_failure(url)
+    if failure is not None:
+        return failure
+    stored = fresh_response(url)
+    if stored is not None:
+        return stored, 200
+    if not Constants.SINGLE_FLIGHT_ENABLED:
+        return await guarded_fetch_async(url, lambda: _fetch_html_content_async(url))
+
+    call = _in_flight.get(url)
+    if call is not None:
+        record_coalesced_request(classify_url(url), 'worker')
+    else:
+        call = asyncio.ensure_future(guarded_fetch_async(url, lambda: _fetch_html_content_async(url)))
+        _in_flight[url] = call
+        call.add_done_callback(lambda _: _in_flight.pop(url, None))
+    # A cancelled caller must not cancel the request the other callers are waiting on
+    return await asyncio.shield(call)
+
+
+async def _send(url: str, headers: dict | None = None) -> tuple[httpx.Response, float]:
+    async with upstream_limiter.async_slot(url) as slot:
+        response = await _get_client().get(url, headers=headers)
+        slot.record(response.status_code, response.headers)
+        elapsed = slot.elapsed()
+    return response, elapsed
+
+
+async def _fetch_html_content_async(url: str) -> tuple[str, int]:
+    start_time = time.time()
+    logger.debug(f"Sending async GET request to {url}")
+
+    try:
+        headers = conditional_headers(url)
+        response = await call_with_retries_async(url, lambda: _send(url, headers), RETRYABLE_EXCEPTIONS)
+        if response.status_code == 304:
+            body = revalidated_body(url)
+            if body is not None:
+                elapsed_time = time.time() - start_time
+                logger.info(f"Revalidated cached HTML content from {url} in {elapsed_time:.2f} seconds")
+                record_upstream_request(url, '304', elapsed_time, engine='async')
+                return body, 200
+            response = await call_with_retries_async(url, lambda: _send(url), RETRYABLE_EXCEPTIONS)
+        response.raise_for_status()
+        elapsed_time = time.time() - start_time
+        logger.info(f"Received HTML content from {url} with status code 200 in {elapsed_time:.2f} seconds")
+        record_upstream_request(url, '200', elapsed_time, engine='async')
+        remember_response(url, response.headers, response.text)
+        return response.text, 200
+    except httpx.HTTPStatusError as e:
+        elapsed_time = time.time() - start_time
+        logger.error(f"HTTP error occurred: {e.response.status_code} - {e.response.reason_phrase} "
+                     f"in {elapsed_time:.2f} seconds")
+        record_upstream_request(url, str(e.response.status_code), elapsed_time, engine='async')
+        return f"HTTP error: {e.response.status_code} - {e.response.reason_phrase}", e.response.status_code
+    except httpx.ConnectError as e:
+        elapsed_time = time.time() - start_time
+        logger.warning(f"Connection error occurred: {e} in {elapsed_time:.2f} seconds")
+        record_upstream_request(url, 'connection_error', elapsed_time, engine='async')
+        return "Connection error occurred", 503
+    except httpx.TimeoutException as e:
+        elapsed_time = time.time() - start_time
+        logger.warning(f"Timeout error occurred: {e} in {elapsed_time:.2f} seconds")
+        record_upstream_request(url, 'timeout', elapsed_time, engine='async')
+        return "Timeout error occurred", 504
+    except httpx.HTTPError as e:
+        elapsed_time = time.time() - start_time
+        logger.error(f"Request error occurred: {e} in {elapsed_time:.2f} seconds")
+        record_upstream_request(url, 'error', elapsed_time, engine='async')
+        return "Request error occurred", 500
+
+
+async def gather_html_contents(urls: List[str]) -> List[tuple[str, int]]:
+    """
+    Fetches every URL concurrently and returns their (content, status) in input order.
+    """
+    return list(await asyncio.gather(*(get_html_content_async(url) for url in urls)))
+
+
+async def iter_html_contents(urls: List[str]) -> AsyncIterator[tuple[int, tuple[str, int]]]:
+    """
+    Fetches every URL concurrently and yields (position in urls, (content, status)) as each response comes back, so
+    the caller can process one while the others are still in flight. Fetches still pending when the caller stops
+    iterating are cancelled.
+    """
+    tasks = {asyncio.ensure_future(get_html_content_async(url)): index for index, url in enumerate(urls)}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield tasks[task], task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def run_async(coroutine: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Runs a coroutine on the worker's fetch loop and blocks until it finishes. This is the adapter synchronous code
+    (Flask views, the thread pools) uses to reach the async engine.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_loop()).result()
+
+
+async def _next_or_missing(iterator: AsyncIterator[Any]) -> Any:
+    try:
+        return await anext(iterator)
+    except StopAsyncIteration:
+        return MISSING
+
+
+def fetch_all(urls: List[str]) -> List[tuple[str, int]]:
+    """
+    Synchronous batch fetch through the async engine.
+    """
+    if not urls:
+        return []
+    logger.debug(f"Fetching {len(urls)} URLs through the async engine")
+    return run_async(gather_html_contents(urls))
+
+
+def iter_fetched(urls: List[str]) -> Iterator[tuple[int, tuple[str, int]]]:
+    """
+    Synchronous adapter over iter_html_contents: the fetches keep running on the fetch loop while the caller
+    processes each response.
+    """
+    if not urls:
+        return
+    logger.debug(f"Fetching {len(urls)} URLs through the async engine")
+    fetched = iter_html_contents(urls)
+    try:
+        while (item := run_async(_next_or_missing(fetched))) is not MISSING:
+            yield item
+    finally:
+        run_async(fetched.aclose())
+
+
+def is_async_engine_enabled() -> bool:
+    return Constants.FETCH_ENGINE == 'async'
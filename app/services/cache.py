@@ -0,0 +1,233 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from app.services.constants import Constants
+from app.services.metrics import record_cache_lookup
+
+logger = logging.getLogger('cache')
+
+MISSING = object()
+
+_bypass_cache: ContextVar[bool | frozenset] = ContextVar('bypass_cache', default=False)
+_caches: Dict[str, 'TTLCache'] = {}
+
+# Every worker has its own caches; clear_cache replaces a stamp file per cache here, and the other workers clear theirs
+# the next time they notice the stamp changed
+_generation_dir = Path(Constants.CACHE_GENERATION_DIR) if Constants.CACHE_GENERATION_DIR else None
+
+
+def _read_generation(name: str) -> tuple[int, int] | None:
+    if _generation_dir is None:
+        return None
+    try:
+        stamp = (_generation_dir / name).stat()
+    except OSError:
+        return None
+    return stamp.st_ino, stamp.st_mtime_ns
+
+
+def _bump_generation(name: str) -> tuple[int, int] | None:
+    _generation_dir.mkdir(parents=True, exist_ok=True)
+    temporary_path = _generation_dir / f'{name}.{os.getpid()}.tmp'
+    temporary_path.write_text(str(time.time()), encoding='utf-8')
+    os.replace(temporary_path, _generation_dir / name)
+    return _read_generation(name)
+
+
+def approximate_size(value: Any) -> int:
+    """
+    Roughly estimates how many bytes a JSON-like value keeps alive. Only meant for bounding cache memory.
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return 8
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(approximate_size(v) for v in value)
+    return 64
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a TTL (or at an explicit timestamp).
+
+    The cache is bounded both by number of entries and by the approximate size of the stored values; the least
+    recently used entries are evicted first when either bound is exceeded.
+    """
+
+    def __init__(self, name: str, max_entries: int, ttl: float, max_bytes: int | None = None,
+                 sizeof: Callable[[Any], int] = approximate_size):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: OrderedDict[Any, tuple[Any, float, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypasses = 0
+        self._generation = _read_generation(name)
+        self._generation_checked_at = time.monotonic()
+        _caches[name] = self
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any, default: Any = MISSING) -> Any:
+        self._check_generation()
+        if is_cache_bypassed(self.name):
+            with self._lock:
+                self.bypasses += 1
+            record_cache_lookup(self.name, 'bypass')
+            return default
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._remove(key, entry[2])
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                value = default
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = entry[0]
+        record_cache_lookup(self.name, 'miss' if entry is None else 'hit')
+        return value
+
+    def set(self, key: Any, value: Any, ttl: float | None = None, expires_at: float | None = None) -> None:
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        size = self._sizeof(value) if self.max_bytes is not None else 0
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._remove(key, entry[2])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _check_generation(self) -> None:
+        """
+        Clears the cache when another worker invalidated it, looking at the stamp file at most once per
+        CACHE_GENERATION_CHECK_INTERVAL.
+        """
+        if _generation_dir is None:
+            return
+        now = time.monotonic()
+        if now - self._generation_checked_at < Constants.CACHE_GENERATION_CHECK_INTERVAL:
+            return
+        self._generation_checked_at = now
+        generation = _read_generation(self.name)
+        if generation != self._generation:
+            self._generation = generation
+            self.clear()
+            logger.info(f"Cleared cache '{self.name}', invalidated by another worker")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'bytes': self._bytes,
+                'maxBytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'bypasses': self.bypasses,
+            }
+
+    def _remove(self, key: Any, size: int) -> None:
+        del self._entries[key]
+        self._bytes -= size
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or
+                                 (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            key, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            logger.debug(f"Evicted {key} from cache '{self.name}'")
+
+
+def is_cache_bypassed(name: str | None = None) -> bool:
+    bypass = _bypass_cache.get()
+    if isinstance(bypass, frozenset):
+        return name in bypass
+    return bypass
+
+
+@contextmanager
+def cache_bypass(enabled: bool = True, names: tuple[str, ...] | None = None):
+    """
+    Makes cache lookups miss for the current context, for every cache or only the named ones. Fresh values are still
+    stored.
+    """
+    token = _bypass_cache.set(frozenset(names) if enabled and names else enabled)
+    try:
+        yield
+    finally:
+        _bypass_cache.reset(token)
+
+
+def set_cache_bypass(enabled: bool):
+    return _bypass_cache.set(enabled)
+
+
+def reset_cache_bypass(token) -> None:
+    _bypass_cache.reset(token)
+
+
+def is_invalidation_shared() -> bool:
+    return _generation_dir is not None
+
+
+def clear_cache(name: str) -> bool:
+    """
+    Clears the named cache of this worker and, unless CACHE_GENERATION_DIR is empty, of every other worker within
+    CACHE_GENERATION_CHECK_INTERVAL. Returns False for an unknown cache.
+    """
+    cache = _caches.get(name)
+    if cache is None:
+        return False
+    cache.clear()
+    if _generation_dir is not None:
+        cache._generation = _bump_generation(name)
+    logger.info(f"Cleared cache '{name}'")
+    return True
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,42 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Iterator, List, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def bounded_map(fn: Callable[[T], R], items: Iterable[T], max_workers: int) -> List[R]:
+    """
+    Applies fn to every item using up to max_workers threads and returns the results in input order.
+
+    Each task runs in a copy of the caller's context, so context variables (e.g. a per-request cache bypass) keep
+    applying inside the pool. With max_workers <= 1, or a single item, the items are processed serially.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+def iter_completed(fn: Callable[[T], R], items: Iterable[T], max_workers: int) -> Iterator[tuple[int, R]]:
+    """
+    Like bounded_map, but yields (index, result) pairs as soon as each item is done instead of waiting for all of
+    them. When the consumer stops early, pending items are cancelled.
+    """
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        for index, item in enumerate(items):
+            yield index, fn(item)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(items)))
+    try:
+        futures = {executor.submit(contextvars.copy_context().run, fn, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
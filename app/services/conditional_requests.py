@@ -0,0 +1,62 @@
+import logging
+from typing import Dict, Mapping
+
+from app.services.cache import TTLCache, MISSING
+from app.services.constants import Constants
+from app.services.response_store import stored_validators, store_response, refresh_response
+
+logger = logging.getLogger('conditional_requests')
+
+# Last full body seen for each upstream URL together with its validators, used to revalidate instead of re-downloading
+validator_cache = TTLCache(
+    'validators',
+    max_entries=Constants.VALIDATOR_CACHE_MAX_ENTRIES,
+    ttl=Constants.VALIDATOR_CACHE_TTL,
+    max_bytes=Constants.VALIDATOR_CACHE_MAX_BYTES,
+)
+
+
+def _stored(url: str) -> Dict[str, str] | None:
+    # This worker's validators first, then those another worker (or a previous run) left in the response store
+    stored = validator_cache.get(url)
+    if stored is not MISSING:
+        return stored
+    return stored_validators(url)
+
+
+def conditional_headers(url: str) -> Dict[str, str]:
+    """
+    Returns the If-None-Match / If-Modified-Since headers for url, or an empty dict when nothing is stored for it.
+    """
+    stored = _stored(url)
+    if stored is None:
+        return {}
+
+    headers = {}
+    if stored['etag']:
+        headers['If-None-Match'] = stored['etag']
+    if stored['lastModified']:
+        headers['If-Modified-Since'] = stored['lastModified']
+    return headers
+
+
+def remember_response(url: str, response_headers: Mapping[str, str], body: str) -> None:
+    store_response(url, body, response_headers)
+    etag = response_headers.get('ETag')
+    last_modified = response_headers.get('Last-Modified')
+    if not etag and not last_modified:
+        return
+    validator_cache.set(url, {'etag': etag, 'lastModified': last_modified, 'body': body})
+
+
+def revalidated_body(url: str) -> str | None:
+    """
+    Returns the stored body to serve after a 304 Not Modified, or None if it was evicted in the meantime.
+    """
+    stored = _stored(url)
+    if stored is None:
+        logger.warning(f"Received 304 for {url} but no stored body is available")
+        return None
+    logger.debug(f"Upstream confirmed {url} is not modified")
+    refresh_response(url)
+    return stored['body']
@@ -1,6 +1,64 @@
+import os
+
+
 class Constants:
-    BASE_URL = 'https://wol.jw.org'
+    BASE_URL = os.getenv('WOL_BASE_URL', 'https://wol.jw.org').rstrip('/')
     TEN_MIN_TALK_DIV_ID = 'tt8'
     PUB_CODE_WATCHTOWER = 'pub-w'
     PUB_CODE_BIBLE = 'pub-nwtsty'
-    UNABLE_TO_FIND = 'UNABLE_TO_FIND'
\ No newline at end of file
+    PUB_CODE_MEETING_WORKBOOK = 'pub-mwb'
+    UNABLE_TO_FIND = 'UNABLE_TO_FIND'
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '32'))
+    REFERENCE_FETCH_WORKERS = int(os.getenv('REFERENCE_FETCH_WORKERS', '8'))
+    CHAPTER_FETCH_WORKERS = int(os.getenv('CHAPTER_FETCH_WORKERS', '4'))
+    UPSTREAM_MAX_CONCURRENCY = int(os.getenv('UPSTREAM_MAX_CONCURRENCY', '16'))
+    UPSTREAM_MIN_CONCURRENCY = int(os.getenv('UPSTREAM_MIN_CONCURRENCY', '1'))
+    UPSTREAM_INITIAL_CONCURRENCY = int(os.getenv('UPSTREAM_INITIAL_CONCURRENCY', '8'))
+    UPSTREAM_LATENCY_TOLERANCE = float(os.getenv('UPSTREAM_LATENCY_TOLERANCE', '3'))
+    UPSTREAM_MAX_RETRY_AFTER = float(os.getenv('UPSTREAM_MAX_RETRY_AFTER', '60'))
+    UPSTREAM_HEDGE_ENABLED = os.getenv('UPSTREAM_HEDGE_ENABLED', 'true').lower() == 'true'
+    UPSTREAM_HEDGE_PERCENTILE = float(os.getenv('UPSTREAM_HEDGE_PERCENTILE', '95'))
+    UPSTREAM_HEDGE_MIN_DELAY = float(os.getenv('UPSTREAM_HEDGE_MIN_DELAY', '0.05'))
+    UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv('UPSTREAM_HEDGE_MIN_SAMPLES', '20'))
+    UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', '2'))
+    UPSTREAM_RETRY_BASE_DELAY = float(os.getenv('UPSTREAM_RETRY_BASE_DELAY', '0.25'))
+    UPSTREAM_RETRY_MAX_DELAY = float(os.getenv('UPSTREAM_RETRY_MAX_DELAY', '5'))
+    REFERENCE_CACHE_MAX_ENTRIES = int(os.getenv('REFERENCE_CACHE_MAX_ENTRIES', '4096'))
+    REFERENCE_CACHE_MAX_BYTES = int(os.getenv('REFERENCE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', str(24 * 60 * 60)))
+    NAVIGATION_CACHE_TIMEZONE = os.getenv('NAVIGATION_CACHE_TIMEZONE', 'UTC')
+    HTML_PARSER_BACKEND = os.getenv('HTML_PARSER_BACKEND', 'html5lib')
+    FRAGMENT_PARSER_ENABLED = os.getenv('FRAGMENT_PARSER_ENABLED', 'true').lower() == 'true'
+    FETCH_ENGINE = os.getenv('FETCH_ENGINE', 'sync')
+    CACHE_GENERATION_DIR = os.getenv('CACHE_GENERATION_DIR', 'data/cache-generations')
+    CACHE_GENERATION_CHECK_INTERVAL = float(os.getenv('CACHE_GENERATION_CHECK_INTERVAL', '1'))
+    STATUS_ADMIN_TOKEN = os.getenv('STATUS_ADMIN_TOKEN', '')
+    PAYLOAD_CACHE_MAX_ENTRIES = int(os.getenv('PAYLOAD_CACHE_MAX_ENTRIES', '64'))
+    URL_PAYLOAD_CACHE_MAX_ENTRIES = int(os.getenv('URL_PAYLOAD_CACHE_MAX_ENTRIES', '256'))
+    PAYLOAD_CACHE_TTL = int(os.getenv('PAYLOAD_CACHE_TTL', str(24 * 60 * 60)))
+    DEGRADED_PAYLOAD_TTL = int(os.getenv('DEGRADED_PAYLOAD_TTL', '60'))
+    WARMER_ENABLED = os.getenv('WARMER_ENABLED', 'false').lower() == 'true'
+    WARMER_SCHEDULE = os.getenv('WARMER_SCHEDULE', '00:05')
+    WARMER_PREFETCH_NEXT_WEEK = os.getenv('WARMER_PREFETCH_NEXT_WEEK', 'false').lower() == 'true'
+    WARMER_RUN_ON_STARTUP = os.getenv('WARMER_RUN_ON_STARTUP', 'true').lower() == 'true'
+    VALIDATOR_CACHE_MAX_ENTRIES = int(os.getenv('VALIDATOR_CACHE_MAX_ENTRIES', '2048'))
+    VALIDATOR_CACHE_MAX_BYTES = int(os.getenv('VALIDATOR_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+    VALIDATOR_CACHE_TTL = int(os.getenv('VALIDATOR_CACHE_TTL', str(7 * 24 * 60 * 60)))
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+    SINGLE_FLIGHT_SHARED_DIR = os.getenv('SINGLE_FLIGHT_SHARED_DIR', '')
+    SINGLE_FLIGHT_SHARED_WAIT = float(os.getenv('SINGLE_FLIGHT_SHARED_WAIT', '30'))
+    WEEK_BATCH_MAX_WEEKS = int(os.getenv('WEEK_BATCH_MAX_WEEKS', '12'))
+    WEEK_BATCH_WORKERS = int(os.getenv('WEEK_BATCH_WORKERS', '4'))
+    ARCHIVE_PATH = os.getenv('ARCHIVE_PATH', 'data/archive.sqlite3')
+    ARCHIVE_REFRESH_INTERVAL = int(os.getenv('ARCHIVE_REFRESH_INTERVAL', str(6 * 60 * 60)))
+    RESPONSE_STORE_PATH = os.getenv('RESPONSE_STORE_PATH', 'data/responses.sqlite3')
+    RESPONSE_STORE_MAX_BYTES = int(os.getenv('RESPONSE_STORE_MAX_BYTES', str(256 * 1024 * 1024)))
+    RESPONSE_STORE_TTLS = os.getenv('RESPONSE_STORE_TTLS', '')
+    CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+    CIRCUIT_BREAKER_FAILURE_RATE = float(os.getenv('CIRCUIT_BREAKER_FAILURE_RATE', '0.5'))
+    CIRCUIT_BREAKER_MIN_REQUESTS = int(os.getenv('CIRCUIT_BREAKER_MIN_REQUESTS', '20'))
+    CIRCUIT_BREAKER_WINDOW = float(os.getenv('CIRCUIT_BREAKER_WINDOW', '30'))
+    CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv('CIRCUIT_BREAKER_OPEN_SECONDS', '15'))
+    NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv('NEGATIVE_CACHE_MAX_ENTRIES', '4096'))
+    NEGATIVE_CACHE_TTL = int(os.getenv('NEGATIVE_CACHE_TTL', '300'))
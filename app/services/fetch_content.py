@@ -1,126 +1,264 @@
+import hashlib
 import logging
+import re
 import time
+from datetime import date, datetime, timedelta
 from urllib.parse import urlparse
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 import requests
-from bs4 import BeautifulSoup
 
+from app.services.cache import TTLCache, MISSING
+from app.services.conditional_requests import conditional_headers, remember_response, revalidated_body
 from app.services.constants import Constants
+from app.services.hedging import call_with_retries
+from app.services.html_parser import make_soup, HtmlDocument
+from app.services.http_client import get_session, upstream_slot
+from app.services.metrics import classify_url, record_upstream_request
+from app.services.response_store import fresh_response
+from app.services.single_flight import SingleFlight, SharedFlight
+from app.services.upstream_guard import cached_failure, guarded_fetch
 
 logger = logging.getLogger('fetch_content')
 
+upstream_flights = SingleFlight(
+    'upstream',
+    shared=SharedFlight(Constants.SINGLE_FLIGHT_SHARED_DIR, Constants.SINGLE_FLIGHT_SHARED_WAIT)
+    if Constants.SINGLE_FLIGHT_SHARED_DIR else None,
+)
+
+# Landing, today and weekly pages only change once a day (or once a week), so the resolved hrefs and bodies along the
+# landing -> today -> weekly chain are kept until the next day/week boundary.
+navigation_cache = TTLCache('navigation', max_entries=64, ttl=24 * 60 * 60)
+
+# Failures worth retrying: the request most likely never reached WOL. Read timeouts are left to hedging, since
+# retrying them could stretch a fetch to several times the read timeout.
+RETRYABLE_EXCEPTIONS = (requests.exceptions.ConnectionError,)
+
+TODAY_HREF_DATE_PATTERN = re.compile(r'/(\d{4})/(\d{1,2})/(\d{1,2})$')
+
+try:
+    _navigation_timezone = ZoneInfo(Constants.NAVIGATION_CACHE_TIMEZONE)
+except ZoneInfoNotFoundError:
+    logger.warning(f"Unknown timezone {Constants.NAVIGATION_CACHE_TIMEZONE}, using UTC for navigation cache expiry")
+    _navigation_timezone = ZoneInfo('UTC')
+
+
+def next_day_boundary() -> float:
+    now = datetime.now(_navigation_timezone)
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return (start_of_day + timedelta(days=1)).timestamp()
+
+
+def next_week_boundary() -> float:
+    now = datetime.now(_navigation_timezone)
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return (start_of_day + timedelta(days=7 - now.weekday())).timestamp()
+
+
+def end_of_week(week_start: date) -> float:
+    return datetime.combine(week_start + timedelta(days=7), datetime.min.time(), _navigation_timezone).timestamp()
+
+
+def navigation_now() -> datetime:
+    return datetime.now(_navigation_timezone)
+
+
+def _digest(html: str) -> str:
+    return hashlib.sha1(html.encode('utf-8')).hexdigest()
+
+
+def _fetch_navigation_page(url: str) -> tuple[str, int]:
+    cached = navigation_cache.get(('page', url))
+    if cached is not MISSING:
+        logger.debug(f"Serving {url} from navigation cache")
+        return cached, 200
+
+    html_content, status_code = get_html_content(url)
+    if status_code == 200:
+        navigation_cache.set(('page', url), html_content, expires_at=next_day_boundary())
+    return html_content, status_code
+
 
 def get_html_content(url: str) -> tuple[str, int]:
     """
     Sends a GET request to the provided URL and returns the HTML content.
 
+    URLs that recently answered with a client error are answered from the negative cache, and while the circuit of the
+    URL's host is open a 503 is returned right away (see upstream_guard). Bodies still within their TTL in the shared
+    response store (see RESPONSE_STORE_PATH) are served without an upstream request. Concurrent calls for the same URL
+    share a single upstream request (see SINGLE_FLIGHT_ENABLED), also across workers when SINGLE_FLIGHT_SHARED_DIR is
+    set.
+
     Args:
     url (str): The URL to send the request to.
 
     Returns:
     tuple[str, int]: A tuple containing the HTML content and the HTTP status code.
     """
-    start_time = time.time()
+    failure = cached_failure(url)
+    if failure is not None:
+        logger.debug(f"{url} failed recently with status code {failure[1]}, not fetching it again")
+        return failure
+    stored = fresh_response(url)
+    if stored is not None:
+        logger.debug(f"Serving {url} from the response store")
+        return stored, 200
+    if not Constants.SINGLE_FLIGHT_ENABLED:
+        return guarded_fetch(url, lambda: _fetch_html_content(url))
+    html_content, status_code = upstream_flights.do(url, lambda: guarded_fetch(url, lambda: _fetch_html_content(url)),
+                                                    label=classify_url(url))
+    return html_content, status_code
+
+
+def _send(url: str, headers: dict | None = None) -> tuple[requests.Response, float]:
+    """
+    One GET attempt of url, inside a slot of the upstream window. Returns the response and how long the request took
+    once admitted, the latency the hedge delay is derived from.
+    """
+    with upstream_slot(url) as slot:
+        response = get_session().get(url, headers=headers, timeout=(6.05, 27))
+        slot.record(response.status_code, response.headers)
+        elapsed = slot.elapsed()
+    return response, elapsed
+
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:126.0) Gecko/20100101 Firefox/126.0',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'es-ES,es;q=0.5',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Referer': Constants.BASE_URL,
-    }
+def _fetch_html_content(url: str) -> tuple[str, int]:
+    start_time = time.time()
 
-    logger.debug(f"Sending GET request to {url} with headers: {headers}")
+    session = get_session()
+    logger.debug(f"Sending GET request to {url} with headers: {session.headers}")
 
     try:
-        response = requests.get(url, headers=headers, timeout=(6.05, 27))
+        # Hedged after the URL class's p95 latency and retried after transient failures (see hedging.py)
+        headers = conditional_headers(url)
+        response = call_with_retries(url, lambda: _send(url, headers), RETRYABLE_EXCEPTIONS)
+        if response.status_code == 304:
+            body = revalidated_body(url)
+            if body is not None:
+                elapsed_time = time.time() - start_time
+                logger.info(f"Revalidated cached HTML content from {url} in {elapsed_time:.2f} seconds")
+                record_upstream_request(url, '304', elapsed_time)
+                return body, 200
+            response = call_with_retries(url, lambda: _send(url), RETRYABLE_EXCEPTIONS)
         response.raise_for_status()
         elapsed_time = time.time() - start_time
         logger.info(f"Received HTML content from {url} with status code 200 in {elapsed_time:.2f} seconds")
         if elapsed_time > 10:
             logger.warning(f"Operation took {elapsed_time:.2f} seconds")
+        record_upstream_request(url, '200', elapsed_time)
+        remember_response(url, response.headers, response.text)
         return response.text, 200
     except requests.exceptions.HTTPError as e:
         elapsed_time = time.time() - start_time
         logger.error(f"HTTP error occurred: {e.response.status_code} - {e.response.reason} in {elapsed_time:.2f} seconds")
         if elapsed_time > 10:
             logger.warning(f"Operation took {elapsed_time:.2f} seconds")
+        record_upstream_request(url, str(e.response.status_code), elapsed_time)
         return f"HTTP error: {e.response.status_code} - {e.response.reason}", e.response.status_code
     except requests.exceptions.ConnectionError as e:
         elapsed_time = time.time() - start_time
         logger.warning(f"Connection error occurred: {e} in {elapsed_time:.2f} seconds")
         if elapsed_time > 10:
             logger.warning(f"Operation took {elapsed_time:.2f} seconds")
+        record_upstream_request(url, 'connection_error', elapsed_time)
         return "Connection error occurred", 503
     except requests.exceptions.Timeout as e:
         elapsed_time = time.time() - start_time
         logger.warning(f"Timeout error occurred: {e} in {elapsed_time:.2f} seconds")
         if elapsed_time > 10:
             logger.warning(f"Operation took {elapsed_time:.2f} seconds")
+        record_upstream_request(url, 'timeout', elapsed_time)
         return "Timeout error occurred", 504
     except requests.exceptions.RequestException as e:
         elapsed_time = time.time() - start_time
         logger.error(f"Request error occurred: {e} in {elapsed_time:.2f} seconds")
         if elapsed_time > 10:
             logger.warning(f"Operation took {elapsed_time:.2f} seconds")
+        record_upstream_request(url, 'error', elapsed_time)
         logger.error(f"Request error occurred: {e}")
         return "Request error occurred", 500
 
 
-def fetch_landing_html() -> tuple[str, int]:
+def fetch_landing_document() -> tuple[HtmlDocument | str, int]:
     base_url = Constants.BASE_URL
 
-    logger.info(f"Fetching landing HTML from {base_url}")
-    html_content, status_code = get_html_content(base_url)
-    logger.debug(f"Received HTML content with status code {status_code}")
+    href_lang_es = navigation_cache.get(('href', 'landing'))
+    if href_lang_es is MISSING:
+        logger.info(f"Fetching landing HTML from {base_url}")
+        html_content, status_code = get_html_content(base_url)
+        logger.debug(f"Received HTML content with status code {status_code}")
 
-    if status_code != 200:
-        logger.error(f"Failed to fetch landing HTML: {html_content}")
-        return html_content, status_code
+        if status_code != 200:
+            logger.error(f"Failed to fetch landing HTML: {html_content}")
+            return html_content, status_code
+
+        soup = make_soup(html_content)
+        href_lang_es = soup.select_one('link[hreflang="es"]')
+        logger.debug(f"Found href_lang_es: {href_lang_es}")
 
-    soup = BeautifulSoup(html_content, 'html5lib')
-    href_lang_es = soup.select_one('link[hreflang="es"]')
-    logger.debug(f"Found href_lang_es: {href_lang_es}")
+        if not href_lang_es:
+            logger.warning("No href found for hreflang='es'")
+            return 'No href found for hreflang="es"', 404
 
-    if not href_lang_es:
-        logger.warning("No href found for hreflang='es'")
-        return 'No href found for hreflang="es"', 404
+        href_lang_es = href_lang_es['href']
+        navigation_cache.set(('href', 'landing'), href_lang_es, expires_at=next_day_boundary())
 
-    href_lang_es = href_lang_es['href']
     logger.info(f"Fetching HTML content from {base_url + href_lang_es}")
-    html_content, status_code = get_html_content(base_url + href_lang_es)
+    html_content, status_code = _fetch_navigation_page(base_url + href_lang_es)
     logger.debug(f"Received HTML content with status code {status_code}")
 
-    return html_content, status_code
+    if status_code != 200:
+        return html_content, status_code
+    return HtmlDocument(html=html_content), status_code
 
 
-def fetch_today_html(base_html: str) -> tuple[str, int]:
-    logger.debug("Parsing base HTML")
-    soup = BeautifulSoup(base_html, 'html5lib')
+def resolve_today_href(base_document: HtmlDocument) -> tuple[str, int]:
+    href_key = ('href', 'today', _digest(base_document.html))
+    today_nav_href = navigation_cache.get(href_key)
+    if today_nav_href is MISSING:
+        logger.debug("Selecting today's navigation link")
+        today_nav = base_document.soup.select_one('#menuToday .todayNav')
+        if not today_nav:
+            logger.warning("No href found for #menuToday .todayNav")
+            return 'No href found for #menuToday .todayNav', 404
+        today_nav_href = today_nav['href']
+        navigation_cache.set(href_key, today_nav_href, expires_at=next_day_boundary())
+    return today_nav_href, 200
 
-    logger.debug("Selecting today's navigation link")
-    today_nav = soup.select_one('#menuToday .todayNav')
-    if not today_nav:
-        logger.warning("No href found for #menuToday .todayNav")
-        return 'No href found for #menuToday .todayNav', 404
-    today_nav_href = today_nav['href']
 
+def fetch_today_document_for_href(today_nav_href: str) -> tuple[HtmlDocument | str, int]:
     logger.info("Fetching today's HTML content from %s", Constants.BASE_URL + today_nav_href)
-    html_content, status_code = get_html_content(Constants.BASE_URL + today_nav_href)
+    html_content, status_code = _fetch_navigation_page(Constants.BASE_URL + today_nav_href)
     logger.debug("Received HTML content with status code %s", status_code)
 
-    return html_content, status_code
-
+    if status_code != 200:
+        return html_content, status_code
+    return HtmlDocument(html=html_content), status_code
 
-def fetch_weekly_html(today_html: str) -> tuple[str, int]:
-    logger.debug("Parsing today's HTML")
-    soup = BeautifulSoup(today_html, 'html5lib')
 
-    pub_w_item = soup.select_one('.todayItem.pub-w:nth-child(2) .itemData a')
-    if not pub_w_item:
-        logger.warning("No href found for .todayItem.pub-w:nth-child(2) .itemData a")
-        return 'No href found for .todayItem.pub-w:nth-child(2) .itemData a', 404
-    pub_w_item_href = pub_w_item['href']
+def fetch_today_document(base_document: HtmlDocument) -> tuple[HtmlDocument | str, int]:
+    today_nav_href, status_code = resolve_today_href(base_document)
+    if status_code != 200:
+        return today_nav_href, status_code
+    return fetch_today_document_for_href(today_nav_href)
+
+
+def fetch_weekly_document(today_document: HtmlDocument) -> tuple[HtmlDocument | str, int]:
+    href_key = ('href', 'weekly', _digest(today_document.html))
+    pub_w_item_href = navigation_cache.get(href_key)
+    if pub_w_item_href is MISSING:
+        pub_w_item = today_document.soup.select_one('.todayItem.pub-w:nth-child(2) .itemData a')
+        if not pub_w_item:
+            logger.warning("No href found for .todayItem.pub-w:nth-child(2) .itemData a")
+            return 'No href found for .todayItem.pub-w:nth-child(2) .itemData a', 404
+        pub_w_item_href = pub_w_item['href']
+        navigation_cache.set(href_key, pub_w_item_href, expires_at=next_day_boundary())
+
+    cached_article = navigation_cache.get(('article', pub_w_item_href))
+    if cached_article is not MISSING:
+        logger.info("Weekly HTML served from navigation cache")
+        return HtmlDocument(html=cached_article), 200
 
     logger.info(f"Fetching weekly HTML content from {Constants.BASE_URL + pub_w_item_href}")
     html_content, status_code = get_html_content(Constants.BASE_URL + pub_w_item_href)
@@ -129,16 +267,84 @@ def fetch_weekly_html(today_html: str) -> tuple[str, int]:
         return html_content, status_code
 
     logger.debug("Parsing weekly HTML")
-    soup = BeautifulSoup(html_content, 'html5lib')
+    soup = make_soup(html_content)
     article_element = soup.find(id='article')
     if not article_element:
         logger.error("No element found with id='article'")
         return 'No element found with id="article"', 404
 
     logger.info("Weekly HTML fetched successfully")
-    return str(article_element), 200
+    # Serialized once per week for the cache, before any parser gets to mutate the element
+    article_html = str(article_element)
+    navigation_cache.set(('article', pub_w_item_href), article_html, expires_at=next_week_boundary())
+    return HtmlDocument(html=article_html, soup=article_element), 200
+
+
+def resolve_today_href_from_landing() -> tuple[str, int]:
+    landing_document, status_code = fetch_landing_document()
+    if status_code != 200:
+        return landing_document, status_code
+    return resolve_today_href(landing_document)
+
+
+def today_href_for_date(today_href: str, day: date) -> str | None:
+    """
+    Builds the href of the "today" page of another day from a today href ending in /<year>/<month>/<day>.
+
+    Returns:
+    str | None: The href for the given day, or None when today_href does not end with a date.
+    """
+    if not TODAY_HREF_DATE_PATTERN.search(today_href):
+        return None
+    return TODAY_HREF_DATE_PATTERN.sub(f'/{day.year}/{day.month}/{day.day}', today_href)
+
+
+def week_start_from_today_href(today_href: str) -> date | None:
+    """
+    Returns the Monday of the week a today href belongs to, or None when the href does not end with a date.
+    """
+    match = TODAY_HREF_DATE_PATTERN.search(today_href)
+    if not match:
+        return None
+    try:
+        day = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        return None
+    return day - timedelta(days=day.weekday())
+
+
+def fetch_today_document_from_landing() -> tuple[HtmlDocument | str, int]:
+    landing_document, status_code = fetch_landing_document()
+    if status_code != 200:
+        return landing_document, status_code
+    return fetch_today_document(landing_document)
 
 
+def fetch_weekly_document_from_landing() -> tuple[HtmlDocument | str, int]:
+    today_document, status_code = fetch_today_document_from_landing()
+    if status_code != 200:
+        return today_document, status_code
+    return fetch_weekly_document(today_document)
+
+
+def _document_to_html(result: tuple[HtmlDocument | str, int]) -> tuple[str, int]:
+    document, status_code = result
+    if status_code != 200:
+        return document, status_code
+    return document.html, status_code
+
+
+def fetch_landing_html() -> tuple[str, int]:
+    return _document_to_html(fetch_landing_document())
+
+
+def fetch_today_html(base_html: str) -> tuple[str, int]:
+    return _document_to_html(fetch_today_document(HtmlDocument(html=base_html)))
+
+
+def fetch_weekly_html(today_html: str) -> tuple[str, int]:
+    return _document_to_html(fetch_weekly_document(HtmlDocument(html=today_html)))
+
 
 def parse_url(url: str) -> dict | None:
     logger.debug(f"Parsing URL: {url}")
@@ -156,7 +362,8 @@ def parse_url(url: str) -> dict | None:
 
 
 def is_wol_jw_org(parsed_url: dict) -> bool:
-    return parsed_url.get('netloc') == 'wol.jw.org'
+    # WOL_BASE_URL may point at a local stub, whose links must validate like the real site's
+    return parsed_url.get('netloc') in ('wol.jw.org', urlparse(Constants.BASE_URL).netloc)
 
 
 def is_url_str_in_wol_jw_org(url: str) -> bool:
@@ -0,0 +1,241 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from html.entities import html5 as HTML5_ENTITIES
+from typing import Callable, Iterator, List
+
+from app.services.constants import Constants
+from app.services.html_parser import get_parser_backend
+
+# html5lib is the only backend whose tree the fragment parser reproduces
+REFERENCE_BACKEND = 'html5lib'
+
+# Elements html5lib inserts as they come while they are properly nested
+FORMATTING_TAGS = frozenset(('a', 'b', 'code', 'em', 'i', 's', 'small', 'strong', 'u'))
+PHRASING_TAGS = FORMATTING_TAGS | frozenset(('abbr', 'cite', 'dfn', 'kbd', 'mark', 'q', 'samp', 'span', 'sub', 'sup',
+                                             'time', 'var'))
+VOID_TAGS = frozenset(('br', 'img', 'wbr'))
+HEADING_TAGS = frozenset(('h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+# Every one of them closes an open <p>, and all but <div> and <p> are "special" in html5lib's tree construction
+BLOCK_TAGS = HEADING_TAGS | frozenset(('article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'figcaption',
+                                       'figure', 'footer', 'header', 'li', 'nav', 'ol', 'p', 'section', 'ul'))
+LIST_ITEM_TAGS = {'li': ('li',), 'dd': ('dd', 'dt'), 'dt': ('dd', 'dt')}
+SUPPORTED_TAGS = PHRASING_TAGS | VOID_TAGS | BLOCK_TAGS
+
+# html5lib drops the whitespace (character references included) in front of everything else, as it comes before <body>
+LEADING_WHITESPACE = '\t\n\f '
+
+START_TAG_PATTERN = re.compile(
+    r'<([a-zA-Z][a-zA-Z0-9]*)'
+    r'((?:[\t\n\f ]+[a-zA-Z_:][-a-zA-Z0-9_:.]*(?:[\t\n\f ]*=[\t\n\f ]*(?:"[^"]*"|\'[^\']*\'|[^\t\n\f "\'=<>`]+))?)*)'
+    r'[\t\n\f ]*/?>'
+)
+ATTRIBUTE_PATTERN = re.compile(
+    r'([a-zA-Z_:][-a-zA-Z0-9_:.]*)(?:[\t\n\f ]*=[\t\n\f ]*(?:"([^"]*)"|\'([^\']*)\'|([^\t\n\f "\'=<>`]+)))?'
+)
+END_TAG_PATTERN = re.compile(r'</([a-zA-Z][a-zA-Z0-9]*)[\t\n\f ]*>')
+# Character references decoded the same way by html5lib and here, plus a bare `&` html5lib keeps as is
+REFERENCE_PATTERN = re.compile(
+    r'&(?:#([0-9]{1,7});|#[xX]([0-9a-fA-F]{1,6});|([a-zA-Z][a-zA-Z0-9]*;)|(?=[\t\n\f <&]|$))'
+)
+
+_fragment_parser_override: ContextVar[bool | None] = ContextVar('fragment_parser_override', default=None)
+
+
+class UnsupportedMarkup(Exception):
+    """
+    Raised for markup whose html5lib tree the fragment parser cannot vouch for.
+    """
+
+
+class FragmentElement:
+    """
+    A parsed element: its tag name, its class list (split the way BeautifulSoup splits it) and its children, which
+    are elements or strings. Adjacent text is merged into one string, as BeautifulSoup's html5lib tree builder does.
+    """
+
+    __slots__ = ('name', 'classes', 'children')
+
+    def __init__(self, name: str, classes: List[str]):
+        self.name = name
+        self.classes = classes
+        self.children: List['FragmentElement | str'] = []
+
+    def strings(self, skip: Callable[['FragmentElement'], bool] | None = None) -> Iterator[str]:
+        """
+        Yields the descendant strings in document order, leaving out the elements (and their content) skip accepts.
+        """
+        for child in self.children:
+            if isinstance(child, str):
+                yield child
+            elif skip is None or not skip(child):
+                yield from child.strings(skip)
+
+    def get_text(self) -> str:
+        return ''.join(self.strings())
+
+    def find_all(self, name: str, class_name: str) -> List['FragmentElement']:
+        """
+        Returns the descendants named name with class_name among their classes, in document order (like
+        `select(f'{name}.{class_name}')`).
+        """
+        found = []
+        for child in self.children:
+            if isinstance(child, FragmentElement):
+                if child.name == name and class_name in child.classes:
+                    found.append(child)
+                found.extend(child.find_all(name, class_name))
+        return found
+
+
+def _decode_reference(match: re.Match) -> str:
+    decimal, hexadecimal, name = match.groups()
+    if name is not None:
+        if name not in HTML5_ENTITIES:
+            raise UnsupportedMarkup(f'unknown character reference &{name}')
+        return HTML5_ENTITIES[name]
+    if decimal is None and hexadecimal is None:
+        return '&'
+    codepoint = int(decimal, 10) if decimal is not None else int(hexadecimal, 16)
+    # html5lib remaps or replaces control characters, surrogates and out of range references
+    if codepoint in (0x09, 0x0A, 0x0C) or 0x20 <= codepoint < 0x7F or \
+            (0xA0 <= codepoint <= 0x10FFFF and not 0xD800 <= codepoint <= 0xDFFF):
+        return chr(codepoint)
+    raise UnsupportedMarkup(f'character reference {match.group(0)}')
+
+
+def _decode_text(text: str) -> str:
+    if '&' not in text:
+        return text
+    decoded, references = REFERENCE_PATTERN.subn(_decode_reference, text)
+    # html5lib decodes legacy references without a semicolon (e.g. `&copy2024`) in ways not worth reproducing
+    if references != text.count('&'):
+        raise UnsupportedMarkup('character reference without a semicolon')
+    return decoded
+
+
+def _classes(attributes: str) -> List[str]:
+    # html5lib keeps the first of duplicated attributes
+    for name, double_quoted, single_quoted, unquoted in ATTRIBUTE_PATTERN.findall(attributes):
+        if name.lower() == 'class':
+            value = double_quoted or single_quoted or unquoted
+            if '&' in value:
+                raise UnsupportedMarkup('character reference in a class attribute')
+            return value.split()
+    return []
+
+
+def _open_element(stack: List[FragmentElement], name: str) -> None:
+    """
+    Rejects the start tags html5lib would not simply insert into the current element: those that close an open <p>,
+    list item or heading, and <a> inside <a>.
+    """
+    if name in BLOCK_TAGS and any(element.name == 'p' for element in stack):
+        raise UnsupportedMarkup(f'<{name}> closes an open <p>')
+    if name in HEADING_TAGS and stack and stack[-1].name in HEADING_TAGS:
+        raise UnsupportedMarkup(f'<{name}> closes an open heading')
+    if name == 'a' and any(element.name == 'a' for element in stack):
+        raise UnsupportedMarkup('nested <a>')
+    closed_by = LIST_ITEM_TAGS.get(name)
+    if closed_by:
+        for element in reversed(stack):
+            if element.name in closed_by:
+                raise UnsupportedMarkup(f'<{name}> closes an open <{element.name}>')
+            if element.name in BLOCK_TAGS and element.name not in ('div', 'p'):
+                break
+
+
+def parse_fragment(markup: str) -> FragmentElement:
+    """
+    Parses an HTML fragment into the tree html5lib builds for it, for a strict subset of HTML: the phrasing and block
+    elements in SUPPORTED_TAGS, properly nested, with text whose character references decode unambiguously.
+
+    Args:
+    markup (str): The fragment, e.g. the `content` of a tooltip.
+
+    Returns:
+    FragmentElement: A root element (named `#document`) holding the fragment's top-level nodes.
+
+    Raises:
+    UnsupportedMarkup: When html5lib could build a different tree (misnested or implicitly closed elements, comments,
+        tables, scripts, ...), so the caller must parse the markup with BeautifulSoup instead.
+    """
+    if '\x00' in markup:
+        raise UnsupportedMarkup('NUL character')
+    markup = markup.replace('\r\n', '\n').replace('\r', '\n')
+
+    root = FragmentElement('#document', [])
+    stack: List[FragmentElement] = []
+    position = 0
+    while position < len(markup):
+        tag_start = markup.find('<', position)
+        if tag_start < 0:
+            tag_start = len(markup)
+        if tag_start > position:
+            text = _decode_text(markup[position:tag_start])
+            if not root.children:
+                text = text.lstrip(LEADING_WHITESPACE)
+            if text:
+                (stack[-1] if stack else root).children.append(text)
+            if tag_start == len(markup):
+                break
+
+        match = START_TAG_PATTERN.match(markup, tag_start)
+        if match:
+            name = match.group(1).lower()
+            if name not in SUPPORTED_TAGS:
+                raise UnsupportedMarkup(f'<{name}>')
+            _open_element(stack, name)
+            element = FragmentElement(name, _classes(match.group(2)))
+            (stack[-1] if stack else root).children.append(element)
+            # A self-closing slash is ignored on anything but void elements, as html5lib does
+            if name not in VOID_TAGS:
+                stack.append(element)
+            position = match.end()
+            continue
+
+        match = END_TAG_PATTERN.match(markup, tag_start)
+        if match:
+            name = match.group(1).lower()
+            if not stack or stack[-1].name != name:
+                raise UnsupportedMarkup(f'misnested </{name}>')
+            stack.pop()
+            position = match.end()
+            continue
+
+        raise UnsupportedMarkup(f'unsupported markup at {tag_start}: {markup[tag_start:tag_start + 20]!r}')
+
+    return root
+
+
+def is_fragment_parser_enabled() -> bool:
+    enabled = _fragment_parser_override.get()
+    if enabled is None:
+        enabled = Constants.FRAGMENT_PARSER_ENABLED
+    return enabled and get_parser_backend() == REFERENCE_BACKEND
+
+
+@contextmanager
+def use_fragment_parser(enabled: bool):
+    """
+    Turns the fragment parser on or off for the current context (and the pools it spawns), e.g. to compare its output
+    with BeautifulSoup's.
+    """
+    token = _fragment_parser_override.set(enabled)
+    try:
+        yield
+    finally:
+        _fragment_parser_override.reset(token)
+
+
+def try_parse_fragment(markup: str) -> FragmentElement | None:
+    """
+    Parses markup with parse_fragment when the fragment parser is enabled and can reproduce the configured backend,
+    or returns None when the caller has to build a soup.
+    """
+    if not is_fragment_parser_enabled():
+        return None
+    try:
+        return parse_fragment(markup)
+    except UnsupportedMarkup:
+        return None
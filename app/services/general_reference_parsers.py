@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
 from bs4 import BeautifulSoup, Tag
 
+from app.services.fragment_parser import FragmentElement, try_parse_fragment
+from app.services.html_parser import make_soup
+
 
 # Strategy Interface
 class ContentParserStrategy(ABC):
@@ -12,7 +15,10 @@ class ContentParserStrategy(ABC):
 # Concrete Strategy for PubW
 class PubWParserStrategy(ContentParserStrategy):
     def parse(self, content: str):
-        soup = BeautifulSoup(content, 'html5lib')
+        fragment = try_parse_fragment(content)
+        if fragment is not None:
+            return '\n'.join([p.get_text().strip() for p in fragment.find_all('p', 'sb')])
+        soup = make_soup(content)
         return '\n'.join([p.text.strip() for p in soup.select('p.sb')])
 
 
@@ -24,20 +30,43 @@ def extract_nwtsty_text_stripping_notes(soup: BeautifulSoup | Tag) -> str:
     return soup.get_text(" ", strip=True)
 
 
+def _is_note_anchor(element: FragmentElement) -> bool:
+    return element.name == 'a' and ('fn' in element.classes or 'b' in element.classes)
+
+
+def extract_fragment_text_stripping_notes(fragment: FragmentElement) -> str:
+    """
+    Same text as extract_nwtsty_text_stripping_notes, read from a parsed fragment.
+    """
+    return " ".join([text for text in (string.strip() for string in fragment.strings(skip=_is_note_anchor)) if text])
+
+
 # Concrete Strategy for PubNwtsty
 class PubNwtstyParserStrategy(ContentParserStrategy):
     def parse(self, content: str):
-        soup = BeautifulSoup(content, 'html5lib')
+        fragment = try_parse_fragment(content)
+        if fragment is not None:
+            return extract_fragment_text_stripping_notes(fragment)
+        soup = make_soup(content)
         return extract_nwtsty_text_stripping_notes(soup)
 
 
 # Default Strategy
 class DefaultParserStrategy(ContentParserStrategy):
     def parse(self, content: str):
-        soup = BeautifulSoup(content, 'html5lib')
+        fragment = try_parse_fragment(content)
+        if fragment is not None:
+            return fragment.get_text()
+        soup = make_soup(content)
         return soup.get_text()
 
 
+# The strategies hold no state, so these instances serve every tooltip
+PUB_W_STRATEGY = PubWParserStrategy()
+PUB_NWTSTY_STRATEGY = PubNwtstyParserStrategy()
+DEFAULT_STRATEGY = DefaultParserStrategy()
+
+
 # Context Class
 class ContentParser:
     def __init__(self, strategy: ContentParserStrategy):
@@ -0,0 +1,268 @@
+import asyncio
+import contextvars
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import Awaitable, Callable, Deque, Dict, Type, TypeVar
+
+from app.services.constants import Constants
+from app.services.http_client import upstream_limiter
+from app.services.metrics import classify_url, record_hedged_request, record_retry
+from app.services.upstream_limiter import parse_retry_after
+
+logger = logging.getLogger('hedging')
+
+R = TypeVar('R')
+
+RETRYABLE_STATUSES = (429, 502, 503, 504)
+
+# Latency samples kept per URL class for the hedge delay
+LATENCY_SAMPLES = 200
+
+# Share of the upstream window hedges may take up (at least one hedge in flight is always allowed), so that hedging
+# cannot double the load on an upstream that is merely slow
+HEDGE_BUDGET = 0.25
+
+# Attempts run on their own threads while hedging, so the caller can take whichever answers first. Each caller holds
+# up to two of them, and the attempts themselves queue in the upstream window.
+_executor = ThreadPoolExecutor(max_workers=4 * Constants.UPSTREAM_MAX_CONCURRENCY, thread_name_prefix='hedge')
+
+
+class LatencyTracker:
+    """
+    Keeps the latest successful attempt latencies of every URL class, to derive the delay after which a request is
+    hedged.
+    """
+
+    def __init__(self, size: int = LATENCY_SAMPLES):
+        self.size = size
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, url_class: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(url_class, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, url_class: str, percentile: float, min_samples: int) -> float | None:
+        with self._lock:
+            samples = sorted(self._samples.get(url_class, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def delays(self) -> Dict[str, float | None]:
+        with self._lock:
+            url_classes = list(self._samples)
+        return {url_class: hedge_delay_for(url_class) for url_class in url_classes}
+
+
+latency_tracker = LatencyTracker()
+
+_active_hedges = 0
+_hedges_lock = threading.Lock()
+
+
+def _start_hedge() -> bool:
+    global _active_hedges
+
+    if upstream_limiter.is_holding():
+        return False
+    with _hedges_lock:
+        if _active_hedges >= max(1, int(upstream_limiter.window * HEDGE_BUDGET)):
+            return False
+        _active_hedges += 1
+        return True
+
+
+def _end_hedge(_) -> None:
+    global _active_hedges
+
+    with _hedges_lock:
+        _active_hedges -= 1
+
+
+def hedge_delay_for(url_class: str) -> float | None:
+    """
+    Returns how long to wait for an attempt before hedging it: the class's UPSTREAM_HEDGE_PERCENTILE latency, or None
+    while hedging is disabled or too few latencies have been seen.
+    """
+    if not Constants.UPSTREAM_HEDGE_ENABLED:
+        return None
+    delay = latency_tracker.percentile(url_class, Constants.UPSTREAM_HEDGE_PERCENTILE,
+                                       Constants.UPSTREAM_HEDGE_MIN_SAMPLES)
+    return None if delay is None else max(delay, Constants.UPSTREAM_HEDGE_MIN_DELAY)
+
+
+def retry_delay(retry: int, retry_after: float | None) -> float | None:
+    """
+    Returns the jittered backoff before retry number `retry` (0 for the first retry), at least retry_after, or None
+    when no retry is left or upstream asked to wait longer than UPSTREAM_RETRY_MAX_DELAY.
+    """
+    if retry >= Constants.UPSTREAM_RETRIES:
+        return None
+    if retry_after is not None and retry_after > Constants.UPSTREAM_RETRY_MAX_DELAY:
+        return None
+    # Full jitter, so the callers that failed together do not all come back together
+    backoff = min(Constants.UPSTREAM_RETRY_MAX_DELAY, Constants.UPSTREAM_RETRY_BASE_DELAY * 2 ** retry)
+    delay = random.uniform(0, backoff)
+    return max(delay, retry_after or 0)
+
+
+def _is_usable(future) -> bool:
+    return not future.cancelled() and future.exception() is None and \
+        future.result()[0].status_code not in RETRYABLE_STATUSES
+
+
+def _observed(url_class: str, timed_result: tuple[R, float]) -> R:
+    # Only the attempt whose response is used is sampled: counting the stalled attempts a hedge overtook would drag
+    # the percentile, and with it the hedge delay, up to the very stalls hedging is meant to cut short
+    result, elapsed = timed_result
+    if result.status_code < 400:
+        latency_tracker.observe(url_class, elapsed)
+    return result
+
+
+def hedged_call(url: str, attempt: Callable[[], tuple[R, float]]) -> R:
+    """
+    Runs attempt (one GET of url returning the response and the seconds it took once admitted to the upstream window,
+    so time queued for the window does not inflate the hedge delay) and, if it has not answered after the hedge delay,
+    runs a duplicate and returns whichever usable response (not an exception nor a retryable status) comes first; when
+    one attempt fails and the other still has not answered a delay later, the failure is returned. The slower attempt
+    is left to finish in the background. While a Retry-After holds requests back or the hedge budget is used up, the
+    hedge waits for another delay.
+    """
+    url_class = classify_url(url)
+    delay = hedge_delay_for(url_class)
+    if delay is None:
+        return _observed(url_class, attempt())
+
+    primary = _executor.submit(contextvars.copy_context().run, attempt)
+    # While hedging is not possible, check again after every further delay: a stalled attempt still gets its hedge
+    while True:
+        try:
+            return _observed(url_class, primary.result(timeout=delay))
+        except FutureTimeoutError:
+            pass
+        if _start_hedge():
+            break
+
+    logger.debug(f"Hedging {url} after {delay:.3f} seconds")
+    hedge = _executor.submit(contextvars.copy_context().run, attempt)
+    hedge.add_done_callback(_end_hedge)
+    pending, failed = {primary, hedge}, None
+    while pending:
+        # Once an attempt failed, the other one only gets another delay before the failure goes back to be retried
+        done, pending = wait(pending, timeout=None if failed is None else delay, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if _is_usable(future):
+                record_hedged_request(url_class, 'primary' if future is primary else 'hedge')
+                return _observed(url_class, future.result())
+            failed = failed or future
+    record_hedged_request(url_class, 'none')
+    return failed.result()[0]
+
+
+async def hedged_call_async(url: str, attempt: Callable[[], Awaitable[tuple[R, float]]]) -> R:
+    """
+    Async counterpart of hedged_call. The slower attempt is cancelled once one answers.
+    """
+    url_class = classify_url(url)
+    delay = hedge_delay_for(url_class)
+    if delay is None:
+        return _observed(url_class, await attempt())
+
+    primary = asyncio.ensure_future(attempt())
+    while True:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return _observed(url_class, primary.result())
+        if _start_hedge():
+            break
+
+    logger.debug(f"Hedging {url} after {delay:.3f} seconds")
+    hedge = asyncio.ensure_future(attempt())
+    # A done callback also runs for a hedge cancelled before it started
+    hedge.add_done_callback(_end_hedge)
+    pending, failed = {primary, hedge}, None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=None if failed is None else delay,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if _is_usable(task):
+                    record_hedged_request(url_class, 'primary' if task is primary else 'hedge')
+                    return _observed(url_class, task.result())
+                failed = failed or task
+        record_hedged_request(url_class, 'none')
+        return failed.result()[0]
+    finally:
+        for task in (primary, hedge):
+            if not task.done():
+                task.cancel()
+
+
+def call_with_retries(url: str, attempt: Callable[[], tuple[R, float]],
+                      retryable: tuple[Type[BaseException], ...]) -> R:
+    """
+    Sends an idempotent GET through hedged_call, retrying with jittered backoff (see retry_delay) after the
+    exceptions in retryable and after 429/502/503/504 responses. The last response or exception is returned or
+    raised once no retry is left.
+    """
+    url_class = classify_url(url)
+    retry = 0
+    while True:
+        try:
+            response = hedged_call(url, attempt)
+        except retryable as e:
+            delay = retry_delay(retry, None)
+            if delay is None:
+                raise
+            reason = 'connection_error'
+            logger.info(f"Retrying {url} in {delay:.2f} seconds after {type(e).__name__}")
+        else:
+            if response.status_code not in RETRYABLE_STATUSES:
+                return response
+            delay = retry_delay(retry, parse_retry_after(response.headers.get('Retry-After')))
+            if delay is None:
+                return response
+            reason = str(response.status_code)
+            logger.info(f"Retrying {url} in {delay:.2f} seconds after HTTP {response.status_code}")
+        record_retry(url_class, reason)
+        time.sleep(delay)
+        retry += 1
+
+
+async def call_with_retries_async(url: str, attempt: Callable[[], Awaitable[tuple[R, float]]],
+                                  retryable: tuple[Type[BaseException], ...]) -> R:
+    """
+    Async counterpart of call_with_retries.
+    """
+    url_class = classify_url(url)
+    retry = 0
+    while True:
+        try:
+            response = await hedged_call_async(url, attempt)
+        except retryable as e:
+            delay = retry_delay(retry, None)
+            if delay is None:
+                raise
+            reason = 'connection_error'
+            logger.info(f"Retrying {url} in {delay:.2f} seconds after {type(e).__name__}")
+        else:
+            if response.status_code not in RETRYABLE_STATUSES:
+                return response
+            delay = retry_delay(retry, parse_retry_after(response.headers.get('Retry-After')))
+            if delay is None:
+                return response
+            reason = str(response.status_code)
+            logger.info(f"Retrying {url} in {delay:.2f} seconds after HTTP {response.status_code}")
+        record_retry(url_class, reason)
+        await asyncio.sleep(delay)
+        retry += 1
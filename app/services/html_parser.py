@@ -0,0 +1,90 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from bs4 import BeautifulSoup, Tag
+from bs4.builder import builder_registry
+
+from app.services.constants import Constants
+
+logger = logging.getLogger('html_parser')
+
+SUPPORTED_BACKENDS = ('html5lib', 'lxml', 'html.parser')
+DEFAULT_BACKEND = 'html5lib'
+
+_backend_override: ContextVar[str | None] = ContextVar('parser_backend_override', default=None)
+
+
+def is_backend_available(backend: str) -> bool:
+    return backend in SUPPORTED_BACKENDS and builder_registry.lookup(backend) is not None
+
+
+def _resolve_configured_backend() -> str:
+    backend = Constants.HTML_PARSER_BACKEND
+    if not is_backend_available(backend):
+        logger.warning(f"HTML parser backend '{backend}' is not available, falling back to '{DEFAULT_BACKEND}'")
+        return DEFAULT_BACKEND
+    logger.info(f"Using HTML parser backend '{backend}'")
+    return backend
+
+
+_configured_backend = _resolve_configured_backend()
+
+
+def get_parser_backend() -> str:
+    return _backend_override.get() or _configured_backend
+
+
+@contextmanager
+def use_parser_backend(backend: str):
+    """
+    Overrides the parser backend for every soup built in the current context (and the pools it spawns).
+    """
+    if not is_backend_available(backend):
+        raise ValueError(f"HTML parser backend '{backend}' is not available")
+    token = _backend_override.set(backend)
+    try:
+        yield
+    finally:
+        _backend_override.reset(token)
+
+
+def make_soup(markup: str) -> BeautifulSoup:
+    """
+    Builds a BeautifulSoup document with the configured parser backend (HTML_PARSER_BACKEND).
+
+    Args:
+    markup (str): The HTML to parse.
+
+    Returns:
+    BeautifulSoup: The parsed document.
+    """
+    return BeautifulSoup(markup, get_parser_backend())
+
+
+class HtmlDocument:
+    """
+    An upstream HTML body that travels from the fetch layer to the parsers and is parsed at most once.
+
+    A document can start from markup (parsed lazily on first access to `soup`) or from an already parsed element
+    (serialized lazily on first access to `html`, only needed by the endpoints that return HTML). Parsers may mutate
+    the soup, so `html` must be read before handing the soup to them when both are needed.
+    """
+
+    def __init__(self, html: str | None = None, soup: BeautifulSoup | Tag | None = None):
+        if html is None and soup is None:
+            raise ValueError('HtmlDocument needs either html or soup')
+        self._html = html
+        self._soup = soup
+
+    @property
+    def html(self) -> str:
+        if self._html is None:
+            self._html = str(self._soup)
+        return self._html
+
+    @property
+    def soup(self) -> BeautifulSoup | Tag:
+        if self._soup is None:
+            self._soup = make_soup(self._html)
+        return self._soup
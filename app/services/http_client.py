@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.constants import Constants
+from app.services.upstream_limiter import AdaptiveLimiter
+
+logger = logging.getLogger('http_client')
+
+try:
+    import brotli  # noqa: F401 - enables br decoding in urllib3
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.15; rv:126.0) Gecko/20100101 Firefox/126.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'es-ES,es;q=0.5',
+    'Accept-Encoding': 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate',
+    'Referer': Constants.BASE_URL,
+    'Connection': 'keep-alive',
+}
+
+_session: requests.Session | None = None
+_session_pid: int | None = None
+_session_lock = threading.Lock()
+
+upstream_limiter = AdaptiveLimiter(
+    min_window=Constants.UPSTREAM_MIN_CONCURRENCY,
+    max_window=Constants.UPSTREAM_MAX_CONCURRENCY,
+    initial_window=Constants.UPSTREAM_INITIAL_CONCURRENCY,
+    latency_tolerance=Constants.UPSTREAM_LATENCY_TOLERANCE,
+    max_retry_after=Constants.UPSTREAM_MAX_RETRY_AFTER,
+)
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=Constants.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=Constants.HTTP_POOL_MAXSIZE,
+        pool_block=False,
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    logger.info(f"Created HTTP session for pid {os.getpid()} "
+                f"(pool_connections={Constants.HTTP_POOL_CONNECTIONS}, pool_maxsize={Constants.HTTP_POOL_MAXSIZE}, "
+                f"brotli={BROTLI_AVAILABLE})")
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the pooled keep-alive session shared by every upstream fetch in this worker.
+
+    The session is created lazily and re-created after a fork, so each gunicorn worker owns its own pool.
+
+    Returns:
+    requests.Session: The shared session.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            _session = _build_session()
+            _session_pid = pid
+    return _session
+
+
+def close_session() -> None:
+    global _session, _session_pid
+
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+        _session_pid = None
+
+
+def upstream_slot(url: str):
+    """
+    Holds a slot of the adaptive upstream window (see upstream_limiter.AdaptiveLimiter) for the duration of an upstream
+    request to url. Report the response with `slot.record(status_code, headers)` so the window can adapt.
+
+    Every fetch goes through this slot, so nested fan-outs (chapters, then references inside each chapter) share one
+    global window per worker, at most UPSTREAM_MAX_CONCURRENCY wide.
+    """
+    return upstream_limiter.slot(url)
@@ -0,0 +1,217 @@
+import functools
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, TypeVar
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, \
+    generate_latest, multiprocess
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Upstream requests take anywhere from tens of milliseconds (tooltips) to the 27s read timeout (slow chapters)
+UPSTREAM_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 27, 60)
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+REFERENCE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+CIRCUIT_STATES = ('closed', 'half_open', 'open')
+
+upstream_request_duration = Histogram(
+    'wol_upstream_request_duration_seconds',
+    'Duration of upstream WOL requests, including revalidation round trips.',
+    ['url_class', 'engine'],
+    buckets=UPSTREAM_BUCKETS,
+)
+upstream_responses = Counter(
+    'wol_upstream_responses_total',
+    'Upstream WOL requests by outcome: the HTTP status, or timeout / connection_error / error.',
+    ['url_class', 'outcome'],
+)
+upstream_coalesced = Counter(
+    'wol_upstream_coalesced_total',
+    'Upstream requests answered by an identical request already in flight, in this worker or in another one.',
+    ['url_class', 'scope'],
+)
+upstream_hedged = Counter(
+    'wol_upstream_hedged_requests_total',
+    'Upstream requests duplicated after the hedge delay, by the attempt that answered first (primary, hedge or none).',
+    ['url_class', 'winner'],
+)
+upstream_retries = Counter(
+    'wol_upstream_retries_total',
+    'Upstream requests retried after a transient failure, by reason (HTTP status or connection_error).',
+    ['url_class', 'reason'],
+)
+upstream_rejected = Counter(
+    'wol_upstream_rejected_total',
+    'Upstream fetches answered without a request, by reason (circuit_open or negative_cache).',
+    ['url_class', 'reason'],
+)
+circuit_state = Gauge(
+    'wol_upstream_circuit_state',
+    'State of the circuit breaker of each upstream host: 0 closed, 1 half-open, 2 open.',
+    ['host'],
+    multiprocess_mode='liveall',
+)
+parse_duration = Histogram(
+    'wol_parse_duration_seconds',
+    'Duration of the parser functions, including the reference lookups they wait on.',
+    ['parser'],
+    buckets=PARSE_BUCKETS,
+)
+references_resolved = Histogram(
+    'wol_references_resolved_per_request',
+    'Number of tooltip references resolved while serving one request.',
+    ['endpoint'],
+    buckets=REFERENCE_BUCKETS,
+)
+cache_lookups = Counter(
+    'wol_cache_lookups_total',
+    'In-process cache lookups by result (hit, miss or bypass).',
+    ['cache', 'result'],
+)
+# Every worker adapts its own window, so the window is reported per live worker and the queues are summed
+upstream_window = Gauge(
+    'wol_upstream_concurrency_window',
+    'Current adaptive cap on upstream requests in flight.',
+    multiprocess_mode='liveall',
+)
+upstream_in_flight = Gauge(
+    'wol_upstream_in_flight',
+    'Upstream requests currently in flight.',
+    multiprocess_mode='livesum',
+)
+upstream_queue_depth = Gauge(
+    'wol_upstream_queue_depth',
+    'Fetches waiting for the upstream concurrency window.',
+    multiprocess_mode='livesum',
+)
+http_request_duration = Histogram(
+    'wol_http_request_duration_seconds',
+    'Duration of the requests served by this service.',
+    ['endpoint', 'method', 'status'],
+    buckets=UPSTREAM_BUCKETS,
+)
+
+
+class ReferenceCounter:
+    """
+    Mutable per-request counter. The same instance is visible from every thread pool task of the request because
+    tasks run in copies of the request's context.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def increment(self):
+        # A lost increment under contention only skews a histogram sample by one
+        self.count += 1
+
+
+_request_references: ContextVar[ReferenceCounter | None] = ContextVar('request_references', default=None)
+
+
+def classify_url(url: str) -> str:
+    """
+    Maps an upstream URL to the page kind it fetches, so latency is comparable within a class:
+    landing, today, article, tooltip, chapter, or other.
+    """
+    path = url.split('://', 1)[-1].partition('/')[2].split('?')[0].split('#')[0]
+    parts = [part for part in path.split('/') if part]
+    if not parts:
+        return 'landing'
+    if 'bc' in parts[:3]:
+        return 'tooltip'
+    if len(parts) >= 3 and parts[1] == 'wol':
+        kind = parts[2]
+        if kind == 'h':
+            return 'today' if len(parts) > 5 else 'landing'
+        if kind == 'd':
+            return 'article'
+        if kind == 'b':
+            return 'chapter'
+    return 'other'
+
+
+def record_upstream_request(url: str, outcome: str, elapsed_time: float, engine: str = 'sync') -> None:
+    url_class = classify_url(url)
+    upstream_request_duration.labels(url_class, engine).observe(elapsed_time)
+    upstream_responses.labels(url_class, outcome).inc()
+
+
+def record_coalesced_request(url_class: str, scope: str) -> None:
+    upstream_coalesced.labels(url_class, scope).inc()
+
+
+def record_hedged_request(url_class: str, winner: str) -> None:
+    upstream_hedged.labels(url_class, winner).inc()
+
+
+def record_retry(url_class: str, reason: str) -> None:
+    upstream_retries.labels(url_class, reason).inc()
+
+
+def record_rejected_request(url_class: str, reason: str) -> None:
+    upstream_rejected.labels(url_class, reason).inc()
+
+
+def record_circuit_state(host: str, state: str) -> None:
+    circuit_state.labels(host).set(CIRCUIT_STATES.index(state))
+
+
+def record_limiter_state(window: int, in_flight: int, queued: int) -> None:
+    upstream_window.set(window)
+    upstream_in_flight.set(in_flight)
+    upstream_queue_depth.set(queued)
+
+
+def record_cache_lookup(cache: str, result: str) -> None:
+    cache_lookups.labels(cache, result).inc()
+
+
+def timed_parser(fn: F) -> F:
+    """
+    Records the duration of every call of the decorated parser under its function name.
+    """
+    histogram = parse_duration.labels(fn.__name__)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - start_time)
+
+    return wrapper
+
+
+def start_request_metrics() -> ReferenceCounter:
+    counter = ReferenceCounter()
+    _request_references.set(counter)
+    return counter
+
+
+def count_resolved_reference() -> None:
+    counter = _request_references.get()
+    if counter is not None:
+        counter.increment()
+
+
+def finish_request_metrics(counter: ReferenceCounter, endpoint: str, method: str, status: int,
+                           elapsed_time: float) -> None:
+    http_request_duration.labels(endpoint, method, str(status)).observe(elapsed_time)
+    if counter.count:
+        references_resolved.labels(endpoint).observe(counter.count)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Renders the metrics in the Prometheus text format. Under gunicorn, PROMETHEUS_MULTIPROC_DIR makes every worker
+    write its samples to shared files, and the samples of all workers are merged here, whichever worker answers.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,96 @@
+"""
+Runs a parser with two HTML backends on the same input and diffs the JSON output.
+
+Usage:
+    python -m app.services.parser_equivalence pub-w article.html [--backends html5lib lxml]
+    python -m app.services.parser_equivalence tooltip tooltip.json --fragment-parser
+
+With --fragment-parser the html5lib output is compared with and without the fragment parser that decodes tooltips
+instead of BeautifulSoup. Exits with status 1 when the outputs differ. Reference lookups hit the network (or the
+configured stub) and bypass the in-process caches, so each backend parses the tooltip fragments itself.
+"""
+import argparse
+import difflib
+import json
+import logging
+import sys
+from typing import Any, Callable, Dict, List
+
+from app.services.cache import cache_bypass
+from app.services.fragment_parser import REFERENCE_BACKEND, use_fragment_parser
+from app.services.html_parser import use_parser_backend
+from app.services.pub_mwb_parser import parse_meeting_workbook_to_json, parse_10min_talk_to_json, \
+    parse_weekly_bible_read, parse_bible_reference
+from app.services.pub_w_parser import parse_html_to_json
+from app.services.reference_link_parser import validate_and_parse_potential_reference_json, \
+    apply_specific_reference_data_parsing
+
+logger = logging.getLogger('parser_equivalence')
+
+PARSERS: Dict[str, Callable[[str], Any]] = {
+    'pub-w': parse_html_to_json,
+    'pub-mwb': parse_meeting_workbook_to_json,
+    'pub-mwb-10min-talk': parse_10min_talk_to_json,
+    'pub-mwb-weekly-scripture-read': parse_weekly_bible_read,
+    'bible-reference': parse_bible_reference,
+    # A tooltip JSON body, decoded the way resolve_reference_data does
+    'tooltip': lambda body: apply_specific_reference_data_parsing(validate_and_parse_potential_reference_json(body)),
+}
+
+
+def run_with_backend(parse_fn: Callable[[str], Any], html: str, backend: str, fragment_parser: bool = True) -> str:
+    with use_parser_backend(backend), use_fragment_parser(fragment_parser), cache_bypass():
+        return json.dumps(parse_fn(html), ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def diff_backends(parse_fn: Callable[[str], Any], html: str, backends: tuple[str, str] = ('html5lib', 'lxml')) -> List[str]:
+    """
+    Parses html with both backends and returns the unified diff of their JSON outputs (empty when equivalent).
+    """
+    expected_backend, actual_backend = backends
+    expected = run_with_backend(parse_fn, html, expected_backend)
+    actual = run_with_backend(parse_fn, html, actual_backend)
+    return list(difflib.unified_diff(expected.splitlines(), actual.splitlines(),
+                                     fromfile=expected_backend, tofile=actual_backend, lineterm=''))
+
+
+def diff_fragment_parser(parse_fn: Callable[[str], Any], html: str) -> List[str]:
+    """
+    Parses html with html5lib, once building a soup for every tooltip and once through the fragment parser, and
+    returns the unified diff of the JSON outputs (empty when equivalent).
+    """
+    expected = run_with_backend(parse_fn, html, REFERENCE_BACKEND, fragment_parser=False)
+    actual = run_with_backend(parse_fn, html, REFERENCE_BACKEND, fragment_parser=True)
+    return list(difflib.unified_diff(expected.splitlines(), actual.splitlines(),
+                                     fromfile='soup', tofile='fragment parser', lineterm=''))
+
+
+def main(argv: List[str] | None = None) -> int:
+    arg_parser = argparse.ArgumentParser(description='Diff parser JSON output across HTML parser backends.')
+    arg_parser.add_argument('parser', choices=sorted(PARSERS))
+    arg_parser.add_argument('files', nargs='+', help='HTML files to parse (tooltip JSON bodies for `tooltip`)')
+    arg_parser.add_argument('--backends', nargs=2, default=['html5lib', 'lxml'], metavar=('EXPECTED', 'ACTUAL'))
+    arg_parser.add_argument('--fragment-parser', action='store_true',
+                            help='Compare html5lib with and without the tooltip fragment parser instead of backends')
+    args = arg_parser.parse_args(argv)
+
+    differences = 0
+    for path in args.files:
+        with open(path, encoding='utf-8') as file:
+            html = file.read()
+        if args.fragment_parser:
+            diff = diff_fragment_parser(PARSERS[args.parser], html)
+        else:
+            diff = diff_backends(PARSERS[args.parser], html, tuple(args.backends))
+        if diff:
+            differences += 1
+            print(f'{path}: outputs differ')
+            print('\n'.join(diff))
+        else:
+            print(f'{path}: equivalent')
+
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
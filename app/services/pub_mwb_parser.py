@@ -1,17 +1,23 @@
 import logging
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterator
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 
+from app.services.async_fetch import get_html_content_async, is_async_engine_enabled, run_async
+from app.services.concurrency import iter_completed
 from app.services.constants import Constants
+from app.services.html_parser import make_soup
 from app.services.fetch_content import get_html_content
 from app.services.general_reference_parsers import (extract_nwtsty_text_stripping_notes)
-from app.services.reference_link_parser import parse_reference_data_from_anchor
+from app.services.metrics import timed_parser
+from app.services.reference_link_parser import parse_reference_data_from_anchor, parse_reference_data_from_anchors, \
+    reference_batch, ReferenceBatch, run_in_reference_batch
 
 logger = logging.getLogger('pub_mwb_parser')
 
 
+@timed_parser
 def parse_10min_talk_from_soup(soup: BeautifulSoup) -> Dict[str, Any]:
     scrape_div = soup.find(id=Constants.TEN_MIN_TALK_DIV_ID)
     if not scrape_div:
@@ -61,8 +67,9 @@ def parse_10min_talk_from_soup(soup: BeautifulSoup) -> Dict[str, Any]:
     return result
 
 
+@timed_parser
 def parse_10min_talk_to_json(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, 'html5lib')
+    soup = make_soup(html)
     return parse_10min_talk_from_soup(soup)
 
 
@@ -75,6 +82,7 @@ def extract_book_name_from_tooltip_caption(caption):
         return caption
 
 
+@timed_parser
 def parse_weekly_bible_read_from_soup(soup: BeautifulSoup) -> Dict[str, Any]:
     result = {
         "bookName": "",
@@ -144,28 +152,64 @@ def parse_weekly_bible_read_from_soup(soup: BeautifulSoup) -> Dict[str, Any]:
 
 
 def parse_weekly_bible_read(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, 'html5lib')
+    soup = make_soup(html)
     return parse_weekly_bible_read_from_soup(soup)
 
 
-def parse_bible_reference(html: str) -> dict:
+def index_elements_by_key(soup: BeautifulSoup, keys: List[str]) -> Dict[str, List[Tag]]:
+    """
+    Maps each key to the elements whose id contains it, like soup.select(f'[id*="{key}"]') but in a single pass.
+
+    Args:
+    soup (BeautifulSoup): The chapter document.
+    keys (List[str]): The section keys to look for.
+
+    Returns:
+    Dict[str, List[Tag]]: The matching elements of every key, in document order.
+    """
+    wanted_keys = {key for key in keys if key}
+    key_lengths = sorted({len(key) for key in wanted_keys})
+    index = {key: [] for key in wanted_keys}
+
+    for element in soup.find_all(id=True):
+        element_id = element['id']
+        matched_keys = set()
+        for length in key_lengths:
+            for start in range(len(element_id) - length + 1):
+                candidate = element_id[start:start + length]
+                if candidate in wanted_keys and candidate not in matched_keys:
+                    matched_keys.add(candidate)
+                    index[candidate].append(element)
+
+    return index
+
+
+@timed_parser
+def parse_bible_reference(html: str, max_workers: int | None = None) -> dict:
     logger.info("Starting to parse Bible reference")
-    soup = BeautifulSoup(html, 'html5lib')
+    soup = make_soup(html)
 
     sections = soup.select('.section:not(:nth-child(1))')
     entries = []
     seen_mnemonics = {}
 
     logger.debug(f"Found {len(sections)} sections to process")
-    for section in sections:
+    section_links = [(section, section.select('.group.index.collapsible .sx a')) for section in sections]
+    all_links = [link for _, links in section_links for link in links]
+    logger.info(f"Fetching reference link data for {len(all_links)} links")
+    with reference_batch() as batch:
+        resolved_links = iter(parse_reference_data_from_anchors(all_links, max_workers=max_workers))
+    logger.info(f"Reference fetch stats: {batch.stats()}")
+    verse_elements_by_key = index_elements_by_key(soup, [section.get('data-key') for section in sections])
+
+    for section, links in section_links:
         references = []
         key = section['data-key']
         prev_mnemonic = None
 
         logger.debug(f"Processing section with key: {key}")
-        for link in section.select('.group.index.collapsible .sx a'):
-            logger.info(f"Fetching reference link data for URL: {link.get('href')}")
-            reference_link_data = parse_reference_data_from_anchor(link)
+        for link in links:
+            reference_link_data = next(resolved_links)
 
             if not reference_link_data['content']:
                 logger.warning(f"Unable to load reference data from link: {reference_link_data['fetchUrl']}")
@@ -207,9 +251,11 @@ def parse_bible_reference(html: str) -> dict:
 
         citation = section.select_one('h3.title').get_text(strip=True)
 
+        # Notes stripped from an earlier section's verses are decomposed, so they must not be visited again
         scripture = ' '.join(
             extract_nwtsty_text_stripping_notes(e)
-            for e in soup.select(f'[id*="{key}"]')
+            for e in verse_elements_by_key.get(key, [])
+            if not e.decomposed
         ).strip()
 
         logger.info(f"Processed citation: {citation}")
@@ -230,40 +276,113 @@ def parse_bible_reference(html: str) -> dict:
     }
 
 
-def extract_references_from_links(links: list[str]) -> dict:
+def fetch_chapter_html(link: str) -> tuple[str, int]:
+    if is_async_engine_enabled():
+        return run_async(get_html_content_async(link))
+    return get_html_content(link)
+
+
+def extract_references_from_link(link: str, max_workers: int | None = None) -> tuple[str, dict]:
+    """
+    Fetches and parses the references of a single chapter link.
+
+    Args:
+    link (str): The chapter link to process.
+    max_workers (int | None): Maximum number of references of the chapter resolved at the same time.
+
+    Returns:
+    tuple[str, dict]: Either ('result', chapter_result) or ('error', error_entry), as found in the output of
+        extract_references_from_links.
+    """
+    try:
+        html_content, status_code = fetch_chapter_html(link)
+        logger.debug(f"Received status code {status_code} for link {link}")
+
+        if status_code != 200:
+            error_msg = f'Failed to fetch content for link: {link}'
+            logger.warning(error_msg)
+            return 'error', {'link': link, 'error': error_msg, 'status_code': status_code}
+
+        parsed_reference = parse_bible_reference(html_content, max_workers=max_workers)
+        logger.debug(f"Parsed reference for link {link}: {parsed_reference}")
+
+        return 'result', {
+            'link': link,
+            'entries': parsed_reference['entries'],
+            'sharedMnemonicReferences': parsed_reference['sharedMnemonicReferences']
+        }
+    except Exception as e:
+        error_msg = f'Error processing link {link}: {e}'
+        logger.error(error_msg)
+        return 'error', {'link': link, 'error': error_msg}
+
+
+def iter_references_from_links(links: list[str], batch: ReferenceBatch, max_workers: int | None = None,
+                               reference_workers: int | None = None,
+                               in_flight_only: bool = False) -> Iterator[tuple[int, str, dict]]:
+    """
+    Yields (index, kind, outcome) for every chapter link as soon as it is processed, in completion order.
+
+    Args:
+    links (list[str]): The chapter links to process.
+    batch (ReferenceBatch): Deduplicates reference fetches across all the links; read its stats once exhausted.
+    max_workers (int | None): Maximum number of chapters processed at the same time. Defaults to
+        Constants.CHAPTER_FETCH_WORKERS.
+    reference_workers (int | None): Maximum number of references of a chapter resolved at the same time.
+    in_flight_only (bool): Keep the batch's resolutions only while a chapter in flight uses them, so memory does not
+        grow with the number of links; later chapters get the references of earlier ones from the reference cache.
+
+    Yields:
+    tuple[int, str, dict]: The position of the link in links, then 'result' or 'error' and the matching entry, as
+        returned by extract_references_from_link.
+    """
+    if max_workers is None:
+        max_workers = Constants.CHAPTER_FETCH_WORKERS
+
+    def process(link: str) -> tuple[str, dict]:
+        if not in_flight_only:
+            return run_in_reference_batch(batch, extract_references_from_link, link, max_workers=reference_workers)
+        with batch.holding():
+            return run_in_reference_batch(batch, extract_references_from_link, link, max_workers=reference_workers)
+
+    for index, (kind, outcome) in iter_completed(process, links, max_workers):
+        yield index, kind, outcome
+
+
+def extract_references_from_links(links: list[str], max_workers: int | None = None,
+                                  reference_workers: int | None = None) -> dict:
+    """
+    Extracts the references of every chapter link.
+
+    Chapters are processed in parallel (up to max_workers, defaulting to Constants.CHAPTER_FETCH_WORKERS) and the
+    references inside each chapter are resolved in parallel as well (up to reference_workers). The total number of
+    upstream requests in flight is capped by the adaptive upstream window, which widens up to
+    Constants.UPSTREAM_MAX_CONCURRENCY while WOL keeps up. Results and errors keep the order of the input links.
+    References are deduplicated by normalized URL across all the links before any fetch, and 'fetchStats' reports how
+    many fetches that saved.
+    """
     logger.info("Starting to extract references from links")
     results = []
     errors = []
 
-    for link in links:
-        try:
-            html_content, status_code = get_html_content(link)
-            logger.debug(f"Received status code {status_code} for link {link}")
-
-            if status_code != 200:
-                error_msg = f'Failed to fetch content for link: {link}'
-                logger.warning(error_msg)
-                errors.append({'link': link, 'error': error_msg, 'status_code': status_code})
-                continue
-
-            parsed_reference = parse_bible_reference(html_content)
-            logger.debug(f"Parsed reference for link {link}: {parsed_reference}")
-
-            if parsed_reference:
-                results.append({
-                    'link': link,
-                    'entries': parsed_reference['entries'],
-                    'sharedMnemonicReferences': parsed_reference['sharedMnemonicReferences']
-                })
-        except Exception as e:
-            error_msg = f'Error processing link {link}: {e}'
-            logger.error(error_msg)
-            errors.append({'link': link, 'error': error_msg})
+    batch = ReferenceBatch()
+    outcomes = sorted(iter_references_from_links(links, batch, max_workers=max_workers,
+                                                 reference_workers=reference_workers),
+                      key=lambda outcome: outcome[0])
+    fetch_stats = batch.stats()
+    logger.info(f"Reference fetch stats for {len(links)} links: {fetch_stats}")
+
+    for _, kind, outcome in outcomes:
+        if kind == 'result':
+            results.append(outcome)
+        else:
+            errors.append(outcome)
 
     logger.info("Finished extracting references from links")
     return {
         'results': results,
-        'errors': errors
+        'errors': errors,
+        'fetchStats': fetch_stats,
     }
 
 
@@ -467,11 +586,16 @@ def parse_christian_living_from_soup(soup: BeautifulSoup) -> Dict[str, Any]:
     return result
 
 
+@timed_parser
 def parse_meeting_workbook_to_json(html: str) -> Dict[str, Any]:
     logger.debug(f"Parsing HTML: {html}")
-    soup = BeautifulSoup(html, 'html5lib')
+    soup = make_soup(html)
     logger.info("Parsed HTML into soup")
+    return parse_meeting_workbook_from_soup(soup)
+
 
+@timed_parser
+def parse_meeting_workbook_from_soup(soup: BeautifulSoup) -> Dict[str, Any]:
     bible_study = parse_weekly_bible_read_from_soup(soup)
     ten_min_talk = parse_10min_talk_from_soup(soup)
     spiritual_gems = parse_spiritual_gems_from_soup(soup)
@@ -1,9 +1,11 @@
 import re
 from typing import Dict, Any, List
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 
-from app.services.reference_link_parser import parse_reference_data_from_anchor
+from app.services.html_parser import make_soup
+from app.services.metrics import timed_parser
+from app.services.reference_link_parser import parse_reference_data_from_anchors
 
 
 def remove_strong_tag(question) -> str:
@@ -46,11 +48,42 @@ from typing import List, Dict, Any
 from bs4 import BeautifulSoup
 
 
-def extract_contents(soup: BeautifulSoup) -> List[Dict[str, Any]]:
+def index_article_paragraphs(soup: BeautifulSoup | Tag) -> Dict[str, Any]:
+    """
+    Walks the article paragraphs once and indexes them for extract_contents.
+
+    Returns:
+    Dict[str, Any]: 'questions' (the p.qu elements in document order), 'questionsByPid' (questions keyed by their
+        data-pid) and 'paragraphsByRelPid' (paragraphs grouped by their data-rel-pid value, in document order).
+    """
+    questions = []
+    questions_by_pid = {}
+    paragraphs_by_rel_pid = {}
+
+    for paragraph in soup.find_all('p'):
+        if 'qu' in paragraph.get('class', []):
+            questions.append(paragraph)
+            data_pid = paragraph.get('data-pid')
+            if data_pid is not None:
+                questions_by_pid.setdefault(data_pid, paragraph)
+        data_rel_pid = paragraph.get('data-rel-pid')
+        if data_rel_pid is not None:
+            paragraphs_by_rel_pid.setdefault(data_rel_pid, []).append(paragraph)
+
+    return {
+        'questions': questions,
+        'questionsByPid': questions_by_pid,
+        'paragraphsByRelPid': paragraphs_by_rel_pid,
+    }
+
+
+def extract_contents(soup: BeautifulSoup, max_workers: int | None = None) -> List[Dict[str, Any]]:
     contents = []
-    questions = soup.find_all('p', class_='qu')
+    article_index = index_article_paragraphs(soup)
+    questions = article_index['questions']
 
     footnote_index = 1
+    pending_references = []
 
     for question in questions:
         p_numbers = extract_paragraph_numbers(question)
@@ -58,7 +91,7 @@ def extract_contents(soup: BeautifulSoup) -> List[Dict[str, Any]]:
         paragraphs = []
 
         data_pid = question.get('data-pid')
-        related_paragraphs = soup.find_all('p', {'data-rel-pid': f'[{data_pid}]'})
+        related_paragraphs = article_index['paragraphsByRelPid'].get(f'[{data_pid}]', [])
 
         for para in related_paragraphs:
             references = {}
@@ -66,8 +99,7 @@ def extract_contents(soup: BeautifulSoup) -> List[Dict[str, Any]]:
             for anchor_ref in para.select('a:not([data-video])'):
                 ref_text = anchor_ref.get_text()
                 anchor_ref.replace_with(f"{ref_text} [^{footnote_index}]")
-                anchor_ref_data = parse_reference_data_from_anchor(anchor_ref)
-                references[footnote_index] = anchor_ref_data['parsedContent']
+                pending_references.append((references, footnote_index, anchor_ref))
                 footnote_index += 1
 
             paragraphs.append({
@@ -81,18 +113,28 @@ def extract_contents(soup: BeautifulSoup) -> List[Dict[str, Any]]:
             'paragraphs': paragraphs
         })
 
+    # Footnotes are numbered while walking the document; the references are resolved afterwards in one batch.
+    anchors = [anchor_ref for _, _, anchor_ref in pending_references]
+    resolved_references = parse_reference_data_from_anchors(anchors, max_workers=max_workers)
+    for (references, index, _), anchor_ref_data in zip(pending_references, resolved_references):
+        references[index] = anchor_ref_data['parsedContent']
+
     return contents
 
 
-def parse_html_to_json(html: str) -> Dict[str, Any]:
-    soup = BeautifulSoup(html, 'html5lib')
+@timed_parser
+def parse_html_to_json(html: str, max_workers: int | None = None) -> Dict[str, Any]:
+    return parse_article_from_soup(make_soup(html), max_workers=max_workers)
+
 
+@timed_parser
+def parse_article_from_soup(soup: BeautifulSoup | Tag, max_workers: int | None = None) -> Dict[str, Any]:
     article_number = soup.find('p', class_='contextTtl').strong.text.strip()
     article_title = soup.find('h1').strong.text.strip()
     article_theme_scripture = soup.find('p', class_='themeScrp').text.strip()
     article_topic = soup.select_one('#tt9 p:nth-of-type(2)').text.strip()
 
-    contents = extract_contents(soup)
+    contents = extract_contents(soup, max_workers=max_workers)
     teach_block = extract_teach_block(soup)
 
     json_data = {
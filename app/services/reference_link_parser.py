@@ -1,17 +1,40 @@
 import json
 import logging
 import re
-from typing import Dict, Any
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Callable
+from urllib.parse import urlsplit, urlunsplit
 
 from bs4 import BeautifulSoup, Tag
 
+from app.services.async_fetch import is_async_engine_enabled, iter_fetched
+from app.services.cache import TTLCache, MISSING
+from app.services.concurrency import bounded_map
 from app.services.constants import Constants
 from app.services.fetch_content import get_html_content
-from app.services.general_reference_parsers import PubWParserStrategy, PubNwtstyParserStrategy, DefaultParserStrategy, \
+from app.services.general_reference_parsers import PUB_W_STRATEGY, PUB_NWTSTY_STRATEGY, DEFAULT_STRATEGY, \
     ContentParser
+from app.services.metrics import count_resolved_reference, timed_parser
 
 logger = logging.getLogger('general_parser')
 
+reference_cache = TTLCache(
+    'reference',
+    max_entries=Constants.REFERENCE_CACHE_MAX_ENTRIES,
+    ttl=Constants.REFERENCE_CACHE_TTL,
+    max_bytes=Constants.REFERENCE_CACHE_MAX_BYTES,
+)
+
+PUB_W_CLASS_PATTERN = re.compile(rf'\b{Constants.PUB_CODE_WATCHTOWER}\b', re.IGNORECASE)
+PUB_NWTSTY_CLASS_PATTERN = re.compile(rf'\b{Constants.PUB_CODE_BIBLE}\b', re.IGNORECASE)
+
+pub_w_content_parser = ContentParser(PUB_W_STRATEGY)
+pub_nwtsty_content_parser = ContentParser(PUB_NWTSTY_STRATEGY)
+default_content_parser = ContentParser(DEFAULT_STRATEGY)
+
 
 def validate_and_parse_potential_reference_json(json_string):
     try:
@@ -30,8 +53,8 @@ def validate_and_parse_potential_reference_json(json_string):
         content = data['items'][0]['content']
         article_classes = data['items'][0]['articleClasses']
 
-        is_pub_w = bool(re.search(rf'\b{Constants.PUB_CODE_WATCHTOWER}\b', article_classes, re.IGNORECASE))
-        is_pub_nwtsty = bool(re.search(rf'\b{Constants.PUB_CODE_BIBLE}\b', article_classes, re.IGNORECASE))
+        is_pub_w = bool(PUB_W_CLASS_PATTERN.search(article_classes))
+        is_pub_nwtsty = bool(PUB_NWTSTY_CLASS_PATTERN.search(article_classes))
 
         return {
             "content": content,
@@ -44,6 +67,7 @@ def validate_and_parse_potential_reference_json(json_string):
         return "Error: Invalid JSON"
 
 
+@timed_parser
 def apply_specific_reference_data_parsing(parsed_json):
     content = parsed_json.get("content")
     is_pub_w = parsed_json.get("isPubW", False)
@@ -51,14 +75,13 @@ def apply_specific_reference_data_parsing(parsed_json):
 
     # Choose the appropriate strategy
     if is_pub_w:
-        parser_strategy = PubWParserStrategy()
+        content_parser = pub_w_content_parser
     elif is_pub_nwtsty:
-        parser_strategy = PubNwtstyParserStrategy()
+        content_parser = pub_nwtsty_content_parser
     else:
-        parser_strategy = DefaultParserStrategy()
+        content_parser = default_content_parser
 
     # Use the context class to parse the content
-    content_parser = ContentParser(parser_strategy)
     parsed_content = content_parser.parse_content(content)
 
     return {
@@ -66,6 +89,244 @@ def apply_specific_reference_data_parsing(parsed_json):
     }
 
 
+def resolve_reference_data(fetch_url: str, fetched: tuple[str, int] | None = None) -> Dict[str, Any] | None:
+    """
+    Fetches and parses the tooltip data behind a reference URL, going through the reference cache.
+
+    Args:
+    fetch_url (str): The tooltip URL to resolve.
+    fetched (tuple[str, int] | None): The (content, status) of the URL when it was already fetched, e.g. by the async
+        engine; the URL is not requested again.
+
+    Returns:
+    Dict[str, Any] | None: The parsed reference data ('content', 'articleClasses', 'isPubW', 'isPubNwtsty', 'rawData'
+        and 'parsedContent'), or None when it could not be loaded. Failures are not cached.
+    """
+    if fetched is None:
+        cached = reference_cache.get(fetch_url)
+        if cached is not MISSING:
+            return cached
+
+    potential_json_content, status_code = fetched if fetched is not None else get_html_content(fetch_url)
+    if status_code != 200:
+        logger.warning(f'Unable to load reference data from link: {fetch_url} (status {status_code})')
+        return None
+
+    maybe_json = validate_and_parse_potential_reference_json(potential_json_content)
+    if isinstance(maybe_json, str):
+        logger.warning('Unable to parse reference data to JSON')
+        return None
+
+    confirmed_json: dict = maybe_json
+    reference_data = dict(confirmed_json)
+    reference_data.update(apply_specific_reference_data_parsing(confirmed_json))
+
+    reference_cache.set(fetch_url, reference_data)
+    return reference_data
+
+
+def normalize_fetch_url(fetch_url: str) -> str:
+    """
+    Normalizes a tooltip URL for deduplication: lowercases scheme and host and drops the fragment, which is never sent
+    upstream.
+    """
+    parts = urlsplit(fetch_url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+
+_batch_holder: ContextVar[set | None] = ContextVar('reference_batch_holder', default=None)
+
+
+class ReferenceBatch:
+    """
+    Deduplicates reference resolution by normalized fetch URL across a unit of work (a chapter, a list of chapter
+    links, ...). The first caller for a URL resolves it; concurrent and later callers wait for and share that result,
+    so duplicates never reach the network.
+
+    Resolutions used inside `holding()` blocks are dropped once no open block uses them anymore, so a long stream of
+    chapters only keeps those of the chapters in flight; a later chapter resolving the same URL again gets it from
+    reference_cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resolutions: Dict[str, Future] = {}
+        self._holders: Dict[str, int] = {}
+        self._seen: set[str] = set()
+        self.requested = 0
+
+    def _hold(self, key: str) -> None:
+        # Called with self._lock held
+        self._seen.add(key)
+        held = _batch_holder.get()
+        if held is not None and key not in held:
+            held.add(key)
+            self._holders[key] = self._holders.get(key, 0) + 1
+
+    @contextmanager
+    def holding(self):
+        """
+        Keeps the resolutions used in the current context (and the pools it spawns) until the block exits, then drops
+        those no other open block uses.
+        """
+        held = set()
+        token = _batch_holder.set(held)
+        try:
+            yield
+        finally:
+            _batch_holder.reset(token)
+            with self._lock:
+                for key in held:
+                    self._holders[key] -= 1
+                    if not self._holders[key]:
+                        del self._holders[key]
+                        self._resolutions.pop(key, None)
+
+    def claim(self, fetch_urls: List[str]) -> List[tuple[str, Future]]:
+        """
+        Registers the URLs nobody in the batch is resolving yet and returns them with their pending resolutions. The
+        caller must complete every returned future.
+        """
+        claimed = []
+        with self._lock:
+            for fetch_url in fetch_urls:
+                key = normalize_fetch_url(fetch_url)
+                self._hold(key)
+                if key not in self._resolutions:
+                    resolution = Future()
+                    self._resolutions[key] = resolution
+                    claimed.append((key, resolution))
+        return claimed
+
+    def resolve(self, fetch_url: str) -> Dict[str, Any] | None:
+        key = normalize_fetch_url(fetch_url)
+        with self._lock:
+            self.requested += 1
+            self._hold(key)
+            resolution = self._resolutions.get(key)
+            is_owner = resolution is None
+            if is_owner:
+                resolution = Future()
+                self._resolutions[key] = resolution
+
+        if is_owner:
+            try:
+                resolution.set_result(resolve_reference_data(key))
+            except BaseException as e:
+                resolution.set_exception(e)
+                raise
+
+        return resolution.result()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            unique = len(self._seen)
+            return {
+                'referencesRequested': self.requested,
+                'uniqueReferences': unique,
+                'fetchesSaved': self.requested - unique,
+            }
+
+
+_current_batch: ContextVar[ReferenceBatch | None] = ContextVar('reference_batch', default=None)
+
+
+class UnresolvedReferences:
+    """
+    Counts the references of a parse that could not be resolved, so a payload built without them is not kept as if it
+    were complete. Like metrics.ReferenceCounter, the same instance is visible from every pool task of the context; a
+    lost increment under contention still leaves the count above zero.
+    """
+
+    def __init__(self, parent: 'UnresolvedReferences | None' = None):
+        self.count = 0
+        self.parent = parent
+
+    def add(self) -> None:
+        tracker = self
+        while tracker is not None:
+            tracker.count += 1
+            tracker = tracker.parent
+
+
+_unresolved_references: ContextVar[UnresolvedReferences | None] = ContextVar('unresolved_references', default=None)
+
+
+@contextmanager
+def track_unresolved_references():
+    """
+    Counts the references that fail to resolve in the current context (and the pools it spawns) until the block exits.
+    Failures also count in the enclosing blocks.
+    """
+    tracker = UnresolvedReferences(_unresolved_references.get())
+    token = _unresolved_references.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _unresolved_references.reset(token)
+
+
+@contextmanager
+def reference_batch():
+    """
+    Deduplicates every reference resolved in the current context (and the pools it spawns) until the block exits.
+    Nested blocks join the outermost batch.
+    """
+    batch = _current_batch.get()
+    if batch is not None:
+        yield batch
+        return
+
+    batch = ReferenceBatch()
+    token = _current_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _current_batch.reset(token)
+
+
+def prefetch_reference_data(batch: ReferenceBatch, fetch_urls: List[str]) -> None:
+    """
+    Resolves the batch's not yet claimed URLs with one concurrent fetch through the async engine. Cached references
+    are served from the cache; everything else is fetched together and parsed as the responses come back.
+    """
+    claimed = batch.claim(fetch_urls)
+    to_fetch = []
+    try:
+        for key, resolution in claimed:
+            cached = reference_cache.get(key)
+            if cached is not MISSING:
+                resolution.set_result(cached)
+            else:
+                to_fetch.append((key, resolution))
+
+        logger.debug(f'Prefetching {len(to_fetch)} references through the async engine')
+        for index, fetched in iter_fetched([key for key, _ in to_fetch]):
+            key, resolution = to_fetch[index]
+            resolution.set_result(resolve_reference_data(key, fetched=fetched))
+    except BaseException as e:
+        for _, resolution in claimed:
+            if not resolution.done():
+                resolution.set_exception(e)
+        raise
+
+
+def build_reference_fetch_url(source_href: str) -> str:
+    return f"{Constants.BASE_URL}{source_href[3:]}"
+
+
+def run_in_reference_batch(batch: ReferenceBatch, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Calls fn with batch installed as the current reference batch, for work that runs outside the `with` block that
+    created the batch (e.g. tasks of a streaming generator).
+    """
+    token = _current_batch.set(batch)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _current_batch.reset(token)
+
+
 """
 Parses reference data from an anchor element.
 
@@ -89,25 +350,46 @@ Raises:
 """
 def parse_reference_data_from_anchor(anchor_element: BeautifulSoup | Tag) -> Dict[str, Any]:
     source_href = anchor_element.get('href')
-    fetch_url = f"https://wol.jw.org{source_href[3:]}"
+    fetch_url = build_reference_fetch_url(source_href)
     result = {
         "sourceHref": source_href,
         "fetchUrl": fetch_url,
         'content': None,
     }
 
-    potential_json_content, status_code = get_html_content(fetch_url)
-    if status_code != 200:
-        logger.warning(f'Unable to load reference data from link: {fetch_url}')
-        return result
+    batch = _current_batch.get()
+    reference_data = batch.resolve(fetch_url) if batch is not None else resolve_reference_data(fetch_url)
+    if reference_data is not None:
+        result.update(reference_data)
+        count_resolved_reference()
+    else:
+        unresolved = _unresolved_references.get()
+        if unresolved is not None:
+            unresolved.add()
 
-    maybe_json = validate_and_parse_potential_reference_json(potential_json_content)
-    if isinstance(maybe_json, str):
-        logger.warning('Unable to parse reference data to JSON')
-        return result
+    return result
 
-    confirmed_json: dict = maybe_json
-    result.update(confirmed_json)
-    result.update(apply_specific_reference_data_parsing(confirmed_json))
 
-    return result
+def parse_reference_data_from_anchors(anchor_elements: List[BeautifulSoup | Tag],
+                                      max_workers: int | None = None) -> List[Dict[str, Any]]:
+    """
+    Resolves the reference data of several anchors with bounded concurrency.
+
+    Args:
+    anchor_elements (List[BeautifulSoup | Tag]): The anchors to resolve.
+    max_workers (int | None): Maximum number of references resolved at the same time. Defaults to
+        Constants.REFERENCE_FETCH_WORKERS; a value of 1 or less resolves them serially.
+
+    Returns:
+    List[Dict[str, Any]]: The reference data of each anchor (see parse_reference_data_from_anchor), in input order.
+    """
+    if max_workers is None:
+        max_workers = Constants.REFERENCE_FETCH_WORKERS
+
+    logger.debug(f'Resolving {len(anchor_elements)} references with up to {max_workers} workers')
+    if not is_async_engine_enabled():
+        return bounded_map(parse_reference_data_from_anchor, anchor_elements, max_workers)
+
+    with reference_batch() as batch:
+        prefetch_reference_data(batch, [build_reference_fetch_url(anchor.get('href')) for anchor in anchor_elements])
+        return bounded_map(parse_reference_data_from_anchor, anchor_elements, max_workers)
@@ -0,0 +1,242 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Mapping
+
+from app.services.cache import is_cache_bypassed
+from app.services.constants import Constants
+from app.services.metrics import classify_url, record_cache_lookup
+
+logger = logging.getLogger('response_store')
+
+RESPONSE_STORE_CACHE_NAME = 'responses'
+
+# Seconds an upstream body is served without asking WOL again, per URL class (see metrics.classify_url). Tooltips and
+# chapters are effectively immutable; the landing pages carry the day's links, so they are left to the navigation
+# cache, which expires at the day boundary. A TTL of 0 keeps the class out of the store.
+DEFAULT_TTLS = {
+    'landing': 0,
+    'today': 6 * 60 * 60,
+    'article': 24 * 60 * 60,
+    'chapter': 7 * 24 * 60 * 60,
+    'tooltip': 7 * 24 * 60 * 60,
+    'other': 0,
+}
+
+# Reads only bump an entry's recency when it is older than this, so hits do not turn into a write each
+ACCESS_RESOLUTION = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    url_class TEXT NOT NULL,
+    body TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+"""
+INDEX = 'CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)'
+
+
+def parse_ttls(spec: str) -> Dict[str, int]:
+    """
+    Parses RESPONSE_STORE_TTLS, e.g. `tooltip=604800,today=3600`, on top of DEFAULT_TTLS.
+    """
+    ttls = dict(DEFAULT_TTLS)
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        url_class, _, seconds = item.partition('=')
+        if url_class.strip() not in DEFAULT_TTLS or not seconds.strip().isdigit():
+            logger.warning(f"Ignoring invalid RESPONSE_STORE_TTLS entry {item!r}")
+            continue
+        ttls[url_class.strip()] = int(seconds)
+    return ttls
+
+
+class ResponseStore:
+    """
+    Upstream response bodies shared by every gunicorn worker (and kept across restarts) in a SQLite database in WAL
+    mode: readers never block, and concurrent writers are serialized by SQLite's write lock.
+
+    Entries are served until their URL class's TTL runs out, and are kept afterwards with their validators so they
+    can still be revalidated with a conditional request. Once the bodies exceed max_bytes, expired entries and then
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttls: Dict[str, int]):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            # sqlite3 cannot create the file in a missing directory (e.g. the gitignored data/ of a fresh checkout)
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute('PRAGMA journal_mode=WAL')
+                    connection.execute(SCHEMA)
+                    connection.execute(INDEX)
+                    connection.commit()
+                    self._initialized = True
+        return connection
+
+    def ttl_for(self, url: str) -> int:
+        return self.ttls.get(classify_url(url), 0)
+
+    def get(self, url: str) -> Dict[str, Any] | None:
+        """
+        Returns the stored entry of url, expired or not, as a dict with body, etag, lastModified and expiresAt.
+        """
+        now = time.time()
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                'SELECT body, etag, last_modified, expires_at, accessed_at FROM responses WHERE url = ?', (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row['accessed_at'] > ACCESS_RESOLUTION:
+                with connection:
+                    connection.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (now, url))
+        return {
+            'body': row['body'],
+            'etag': row['etag'],
+            'lastModified': row['last_modified'],
+            'expiresAt': row['expires_at'],
+        }
+
+    def put(self, url: str, body: str, etag: str | None, last_modified: str | None) -> None:
+        ttl = self.ttl_for(url)
+        if ttl <= 0:
+            return
+        now = time.time()
+        size = len(body.encode('utf-8'))
+        with closing(self._connect()) as connection, connection:
+            connection.execute(
+                'INSERT INTO responses (url, url_class, body, size, etag, last_modified, stored_at, expires_at, '
+                'accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (url) DO UPDATE SET body = excluded.body, size = excluded.size, etag = excluded.etag, '
+                'last_modified = excluded.last_modified, stored_at = excluded.stored_at, '
+                'expires_at = excluded.expires_at, accessed_at = excluded.accessed_at',
+                (url, classify_url(url), body, size, etag, last_modified, now, now + ttl, now),
+            )
+            self._evict(connection, now)
+
+    def refresh(self, url: str) -> None:
+        """
+        Starts a new TTL for url after upstream confirmed (with a 304) that the stored body is still current.
+        """
+        ttl = self.ttl_for(url)
+        if ttl <= 0:
+            return
+        now = time.time()
+        with closing(self._connect()) as connection, connection:
+            connection.execute('UPDATE responses SET expires_at = ?, accessed_at = ? WHERE url = ?',
+                               (now + ttl, now, url))
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        # Runs inside the writer's transaction, so concurrent writers cannot evict the same bytes twice
+        total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        evicted = []
+        for row in connection.execute('SELECT url, size FROM responses ORDER BY expires_at > ?, accessed_at', (now,)):
+            evicted.append((row['url'],))
+            excess -= row['size']
+            if excess <= 0:
+                break
+        connection.executemany('DELETE FROM responses WHERE url = ?', evicted)
+        logger.debug(f"Evicted {len(evicted)} responses to stay under {self.max_bytes} bytes")
+
+    def clear(self) -> None:
+        with closing(self._connect()) as connection, connection:
+            connection.execute('DELETE FROM responses')
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                'SELECT url_class, COUNT(*) AS entries, SUM(expires_at > ?) AS fresh, SUM(size) AS bytes '
+                'FROM responses GROUP BY url_class', (now,),
+            ).fetchall()
+        classes = {row['url_class']: {'entries': row['entries'], 'fresh': row['fresh'], 'bytes': row['bytes']}
+                   for row in rows}
+        return {
+            'path': self.path,
+            'bytes': sum(entry['bytes'] for entry in classes.values()),
+            'maxBytes': self.max_bytes,
+            'ttls': self.ttls,
+            'classes': classes,
+        }
+
+
+response_store = ResponseStore(Constants.RESPONSE_STORE_PATH, Constants.RESPONSE_STORE_MAX_BYTES,
+                               parse_ttls(Constants.RESPONSE_STORE_TTLS)) if Constants.RESPONSE_STORE_PATH else None
+
+
+def fresh_response(url: str) -> str | None:
+    """
+    Returns the stored body of url while it is within its TTL. Lookups are skipped while the `responses` cache is
+    bypassed; bodies fetched meanwhile are still stored.
+    """
+    if response_store is None or response_store.ttl_for(url) <= 0:
+        return None
+    if is_cache_bypassed(RESPONSE_STORE_CACHE_NAME):
+        record_cache_lookup(RESPONSE_STORE_CACHE_NAME, 'bypass')
+        return None
+    try:
+        entry = response_store.get(url)
+    except sqlite3.Error as e:
+        logger.error(f"Unable to read the response store: {e}")
+        return None
+    if entry is None or entry['expiresAt'] <= time.time():
+        record_cache_lookup(RESPONSE_STORE_CACHE_NAME, 'miss')
+        return None
+    record_cache_lookup(RESPONSE_STORE_CACHE_NAME, 'hit')
+    return entry['body']
+
+
+def stored_validators(url: str) -> Dict[str, Any] | None:
+    """
+    Returns the stored entry of url (even past its TTL) when it carries an ETag or Last-Modified to revalidate with.
+    """
+    if response_store is None:
+        return None
+    try:
+        entry = response_store.get(url)
+    except sqlite3.Error as e:
+        logger.error(f"Unable to read the response store: {e}")
+        return None
+    if entry is None or not (entry['etag'] or entry['lastModified']):
+        return None
+    return entry
+
+
+def store_response(url: str, body: str, response_headers: Mapping[str, str]) -> None:
+    if response_store is None:
+        return
+    try:
+        response_store.put(url, body, response_headers.get('ETag'), response_headers.get('Last-Modified'))
+    except sqlite3.Error as e:
+        logger.error(f"Unable to store the response of {url}: {e}")
+
+
+def refresh_response(url: str) -> None:
+    if response_store is None:
+        return
+    try:
+        response_store.refresh(url)
+    except sqlite3.Error as e:
+        logger.error(f"Unable to refresh the stored response of {url}: {e}")
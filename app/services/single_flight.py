@@ -0,0 +1,193 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from app.services.metrics import record_coalesced_request
+
+logger = logging.getLogger('single_flight')
+
+# How often the leader looks for result files nobody can be waiting for anymore
+PRUNE_INTERVAL = 60
+LOCK_POLL_INTERVAL = 0.02
+
+
+class SharedFlight:
+    """
+    Coalesces calls across processes through lock and result files in a shared directory.
+
+    The first process to lock a key runs the call and writes its JSON-serializable result; processes that were waiting
+    on the lock read that result instead of calling again. The lock is polled without blocking so gevent workers keep
+    serving other requests while they wait.
+    """
+
+    def __init__(self, directory: str, wait_timeout: float):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.wait_timeout = wait_timeout
+        self._last_prune = time.time()
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.directory / f'{digest}.lock', self.directory / f'{digest}.json'
+
+    def _read_result(self, result_path: Path, completed_after: float) -> tuple[bool, Any]:
+        try:
+            stored = json.loads(result_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return False, None
+        if stored['completedAt'] < completed_after:
+            return False, None
+        return True, stored['result']
+
+    def _write_result(self, result_path: Path, result: Any) -> None:
+        temporary_path = result_path.with_suffix(f'.{os.getpid()}.tmp')
+        temporary_path.write_text(json.dumps({'completedAt': time.time(), 'result': result}), encoding='utf-8')
+        os.replace(temporary_path, result_path)
+
+    def _lock(self, fd: int, deadline: float) -> bool:
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.time() >= deadline:
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    @staticmethod
+    def _is_current(fd: int, lock_path: Path) -> bool:
+        # False when the lock file was pruned (and maybe recreated) after fd was opened
+        try:
+            return os.fstat(fd).st_ino == lock_path.stat().st_ino
+        except OSError:
+            return False
+
+    def _acquire(self, lock_path: Path, deadline: float) -> tuple[int, bool, bool]:
+        """
+        Opens and locks lock_path, reopening it when it was pruned in the meantime. Returns (fd, locked, waited): the
+        file descriptor to close, whether it is locked (False once the deadline passed) and whether another process
+        held the lock first.
+        """
+        waited = False
+        while True:
+            fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                waited = True
+                if not self._lock(fd, deadline):
+                    return fd, False, waited
+            if self._is_current(fd, lock_path):
+                # Keeps the lock file of a busy key from looking stale to _prune
+                os.utime(fd)
+                return fd, True, waited
+            os.close(fd)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Returns (result, shared): the result of fn, or the result another process produced for key while this one
+        waited. Waiting is capped at wait_timeout, after which fn is called regardless.
+        """
+        lock_path, result_path = self._paths(key)
+        started_at = time.time()
+        fd, locked, waited = self._acquire(lock_path, started_at + self.wait_timeout)
+        try:
+            if not locked:
+                logger.warning(f'Gave up waiting for another worker to fetch {key}')
+                return fn(), False
+            if waited:
+                found, result = self._read_result(result_path, started_at)
+                if found:
+                    return result, True
+
+            result = fn()
+            self._write_result(result_path, result)
+            return result, False
+        finally:
+            os.close(fd)
+            self._prune()
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        for result_path in self.directory.glob('*.json'):
+            try:
+                if now - result_path.stat().st_mtime > PRUNE_INTERVAL:
+                    result_path.unlink()
+            except OSError:
+                pass
+        for lock_path in self.directory.glob('*.lock'):
+            self._prune_lock(lock_path, now)
+
+    def _prune_lock(self, lock_path: Path, now: float) -> None:
+        """
+        Removes a lock file nobody used for PRUNE_INTERVAL. It is only unlinked while locked here, so no process holds
+        it; a process that opened it before and locks it afterwards sees the file is gone and opens a new one.
+        """
+        try:
+            fd = os.open(lock_path, os.O_RDWR)
+        except OSError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if self._is_current(fd, lock_path) and now - os.fstat(fd).st_mtime > PRUNE_INTERVAL:
+                lock_path.unlink()
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the call and every caller that arrives while it
+    is in flight gets the same result (or exception) instead of calling again. With a SharedFlight, the caller that
+    runs the call also coalesces with the other workers.
+    """
+
+    def __init__(self, name: str, shared: SharedFlight | None = None):
+        self.name = name
+        self.shared = shared
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], label: str = '') -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = Future()
+                self._calls[key] = call
+
+        if not is_leader:
+            record_coalesced_request(label, 'worker')
+            return call.result()
+
+        try:
+            if self.shared is not None:
+                result, shared = self.shared.do(key, fn)
+                if shared:
+                    record_coalesced_request(label, 'shared')
+            else:
+                result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
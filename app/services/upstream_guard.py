@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+from urllib.parse import urlsplit
+
+from app.services.cache import TTLCache, MISSING
+from app.services.constants import Constants
+from app.services.metrics import classify_url, record_circuit_state, record_rejected_request
+
+logger = logging.getLogger('upstream_guard')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Client errors that say nothing about the URL itself, so they are never cached as failures
+TRANSIENT_CLIENT_ERRORS = (408, 425, 429)
+
+# Short-lived memory of URLs that answered with a client error (typically tooltips that 404), so they are not requested
+# again on every call
+negative_cache = TTLCache(
+    'negative',
+    max_entries=Constants.NEGATIVE_CACHE_MAX_ENTRIES,
+    ttl=Constants.NEGATIVE_CACHE_TTL,
+)
+
+
+class CircuitBreaker:
+    """
+    Fails fetches to a host fast while it is unhealthy.
+
+    Closed, outcomes of the last `window` seconds are tracked, and once at least min_requests of them failed at
+    failure_rate or more, the breaker opens: every fetch is rejected for open_seconds. It then lets a single probe
+    through (half-open); the probe's success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, host: str, failure_rate: float, min_requests: int, window: float, open_seconds: float):
+        self.host = host
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self._outcomes: Deque[tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info(f"Probing {self.host} after {self.open_seconds:.0f}s with the circuit open")
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool | None) -> None:
+        """
+        Records the outcome of an allowed fetch; None (e.g. a cancelled fetch) only frees the half-open probe.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing:
+                self._probing = False
+                if success:
+                    self._outcomes.clear()
+                    self._failures = 0
+                    self._set_state(CLOSED)
+                elif success is not None:
+                    self._open()
+                return
+            if self.state != CLOSED or success is None:
+                return
+
+            now = time.monotonic()
+            self._outcomes.append((now, success))
+            self._failures += not success
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._failures -= not self._outcomes.popleft()[1]
+            if len(self._outcomes) >= self.min_requests and \
+                    self._failures / len(self._outcomes) >= self.failure_rate:
+                self._open()
+
+    def _open(self) -> None:
+        failures, total = self._failures, len(self._outcomes)
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._failures = 0
+        self.opened += 1
+        self._set_state(OPEN)
+        logger.warning(f"Circuit for {self.host} opened ({failures}/{total} recent fetches failed), failing fast for "
+                       f"{self.open_seconds:.0f}s")
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        record_circuit_state(self.host, state)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'state': self.state,
+                'recentFetches': len(self._outcomes),
+                'recentFailures': self._failures,
+                'opened': self.opened,
+                'rejected': self.rejected,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url: str) -> CircuitBreaker | None:
+    if not Constants.CIRCUIT_BREAKER_ENABLED:
+        return None
+    host = urlsplit(url).netloc.lower()
+    breaker = _breakers.get(host)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(host, CircuitBreaker(
+                host,
+                failure_rate=Constants.CIRCUIT_BREAKER_FAILURE_RATE,
+                min_requests=Constants.CIRCUIT_BREAKER_MIN_REQUESTS,
+                window=Constants.CIRCUIT_BREAKER_WINDOW,
+                open_seconds=Constants.CIRCUIT_BREAKER_OPEN_SECONDS,
+            ))
+    return breaker
+
+
+def get_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {host: breaker.stats() for host, breaker in list(_breakers.items())}
+
+
+def cached_failure(url: str) -> tuple[str, int] | None:
+    """
+    Returns the (message, status) of a client error url answered recently, or None.
+    """
+    failure = negative_cache.get(url)
+    if failure is MISSING:
+        return None
+    record_rejected_request(classify_url(url), 'negative_cache')
+    return failure
+
+
+def _is_upstream_healthy(status_code: int) -> bool:
+    # A 404 still means the host is up; throttling and server errors do not
+    return status_code < 500 and status_code != 429
+
+
+def _settle(url: str, breaker: CircuitBreaker | None, result: tuple[str, int]) -> tuple[str, int]:
+    content, status_code = result
+    if breaker is not None:
+        breaker.record(_is_upstream_healthy(status_code))
+    if 400 <= status_code < 500 and status_code not in TRANSIENT_CLIENT_ERRORS:
+        negative_cache.set(url, (content, status_code))
+    return result
+
+
+def _reject(url: str, breaker: CircuitBreaker) -> tuple[str, int]:
+    record_rejected_request(classify_url(url), 'circuit_open')
+    logger.debug(f"Circuit for {breaker.host} is open, not fetching {url}")
+    return f"Circuit open for {breaker.host}", 503
+
+
+def guarded_fetch(url: str, fetch: Callable[[], tuple[str, int]]) -> tuple[str, int]:
+    """
+    Runs fetch (which returns (content, status) like get_html_content) unless the circuit of url's host is open, in
+    which case a 503 is returned right away. The outcome feeds the breaker, and client errors are remembered in the
+    negative cache.
+    """
+    breaker = breaker_for(url)
+    if breaker is not None and not breaker.allow():
+        return _reject(url, breaker)
+    try:
+        result = fetch()
+    except Exception:
+        if breaker is not None:
+            breaker.record(False)
+        raise
+    except BaseException:
+        if breaker is not None:
+            breaker.record(None)
+        raise
+    return _settle(url, breaker, result)
+
+
+async def guarded_fetch_async(url: str, fetch: Callable[[], Awaitable[tuple[str, int]]]) -> tuple[str, int]:
+    """
+    Async counterpart of guarded_fetch.
+    """
+    breaker = breaker_for(url)
+    if breaker is not None and not breaker.allow():
+        return _reject(url, breaker)
+    try:
+        result = await fetch()
+    except Exception:
+        if breaker is not None:
+            breaker.record(False)
+        raise
+    except BaseException:
+        if breaker is not None:
+            breaker.record(None)
+        raise
+    return _settle(url, breaker, result)
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Mapping
+
+from app.services.metrics import classify_url, record_limiter_state
+
+logger = logging.getLogger('upstream_limiter')
+
+THROTTLED_STATUSES = (429, 503)
+
+# Latency-driven decreases are gentler than those caused by an explicit throttle or a failed request
+LATENCY_DECREASE_FACTOR = 0.9
+# Latencies this much above the baseline (on top of the tolerance factor) still count as uncongested
+LATENCY_SLACK = 0.1
+# How fast a URL class's baseline latency follows latencies above it; lower latencies replace it at once
+BASELINE_DRIFT = 0.01
+# Requests already in flight when the window shrinks report the same congestion, so one decrease per cooldown
+DECREASE_COOLDOWN = 1.0
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date, into seconds from now.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class Slot:
+    """
+    One admitted upstream request. The caller reports the response through record(); a slot left without a response
+    (the request raised) counts as a failure.
+    """
+
+    def __init__(self, url_class: str):
+        self.url_class = url_class
+        self.started_at = time.monotonic()
+        self.status: int | None = None
+        self.retry_after: float | None = None
+        self.cancelled = False
+
+    def elapsed(self) -> float:
+        """
+        Seconds since the slot was admitted: the upstream request's own duration, without the time spent queued for
+        the window.
+        """
+        return time.monotonic() - self.started_at
+
+    def record(self, status: int, headers: Mapping[str, str] | None = None) -> None:
+        self.status = status
+        if headers is not None:
+            self.retry_after = parse_retry_after(headers.get('Retry-After'))
+
+
+class AdaptiveLimiter:
+    """
+    Caps the upstream requests in flight with a window that adapts to how WOL copes, additive-increase /
+    multiplicative-decrease style:
+
+    - every successful response while the window is in use grows it by 1/window, i.e. by one per window of responses,
+      up to max_window;
+    - a 429/503 (or any other 5xx), a failed request, or a latency well above the URL class's baseline shrinks it
+      multiplicatively, down to min_window;
+    - a Retry-After on a throttled response holds back every new request until it has passed.
+
+    Synchronous callers (threads and greenlets) and coroutines on the async engine's loop wait in the same queue, so
+    both engines share one window per worker.
+    """
+
+    def __init__(self, min_window: int, max_window: int, initial_window: int, decrease_factor: float = 0.5,
+                 latency_tolerance: float = 3.0, max_retry_after: float = 60):
+        self.min_window = max(1, min_window)
+        self.max_window = max(self.min_window, max_window)
+        self.window = float(min(self.max_window, max(self.min_window, initial_window)))
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._baselines: Dict[str, float] = {}
+        self._wakers: List[Callable[[], None]] = []
+        self.increases = 0
+        self.decreases = 0
+        self.throttled = 0
+        self._publish()
+
+    def _try_acquire(self) -> tuple[bool, float | None]:
+        """
+        Takes a slot if the window allows it. Otherwise returns how long to wait before checking again: the rest of
+        a Retry-After hold, or None to wait until a slot is released.
+        """
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return False, self._blocked_until - now
+        if self._in_flight < int(self.window):
+            self._in_flight += 1
+            return True, None
+        return False, None
+
+    def acquire(self) -> None:
+        with self._lock:
+            acquired, _ = self._try_acquire()
+            if acquired:
+                return
+            self._queued += 1
+        self._publish()
+        try:
+            while True:
+                event = threading.Event()
+                with self._lock:
+                    acquired, wait = self._try_acquire()
+                    if acquired:
+                        return
+                    self._wakers.append(event.set)
+                event.wait(wait)
+        finally:
+            with self._lock:
+                self._queued -= 1
+            self._publish()
+
+    async def acquire_async(self) -> None:
+        with self._lock:
+            acquired, _ = self._try_acquire()
+            if acquired:
+                return
+            self._queued += 1
+        self._publish()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                woken = loop.create_future()
+                with self._lock:
+                    acquired, wait = self._try_acquire()
+                    if acquired:
+                        return
+                    # Releases happen on other threads too, so the future is resolved through the loop
+                    self._wakers.append(lambda: loop.call_soon_threadsafe(_resolve, woken))
+                try:
+                    await asyncio.wait_for(woken, wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._queued -= 1
+            self._publish()
+
+    def release(self, slot: Slot) -> None:
+        latency = time.monotonic() - slot.started_at
+        with self._lock:
+            window_in_use = self._in_flight >= int(self.window)
+            self._in_flight -= 1
+            if slot.cancelled:
+                pass
+            elif slot.status in THROTTLED_STATUSES:
+                self.throttled += 1
+                if slot.retry_after:
+                    hold = min(slot.retry_after, self.max_retry_after)
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + hold)
+                    logger.warning(f"Upstream asked to retry after {slot.retry_after:.0f}s, holding requests "
+                                   f"for {hold:.0f}s")
+                self._decrease(self.decrease_factor)
+            elif slot.status is None or slot.status >= 500:
+                self._decrease(self.decrease_factor)
+            elif slot.status < 400:
+                baseline = self._baselines.get(slot.url_class)
+                if baseline is None or latency < baseline:
+                    self._baselines[slot.url_class] = latency
+                else:
+                    self._baselines[slot.url_class] = baseline + (latency - baseline) * BASELINE_DRIFT
+                if baseline is not None and latency > baseline * self.latency_tolerance + LATENCY_SLACK:
+                    self._decrease(LATENCY_DECREASE_FACTOR)
+                elif window_in_use and self.window < self.max_window:
+                    self.window = min(self.max_window, self.window + 1 / self.window)
+                    self.increases += 1
+            wakers, self._wakers = self._wakers, []
+        for wake in wakers:
+            wake()
+        self._publish()
+
+    def _decrease(self, factor: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        previous = self.window
+        self.window = max(float(self.min_window), self.window * factor)
+        if self.window < previous:
+            self.decreases += 1
+            logger.info(f"Upstream concurrency window decreased from {previous:.1f} to {self.window:.1f}")
+
+    def is_holding(self) -> bool:
+        """
+        Whether new requests are held back by a Retry-After.
+        """
+        return time.monotonic() < self._blocked_until
+
+    def _publish(self) -> None:
+        record_limiter_state(int(self.window), self._in_flight, self._queued)
+
+    @contextmanager
+    def slot(self, url: str):
+        self.acquire()
+        slot = Slot(classify_url(url))
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    @asynccontextmanager
+    async def async_slot(self, url: str):
+        await self.acquire_async()
+        slot = Slot(classify_url(url))
+        try:
+            yield slot
+        except asyncio.CancelledError:
+            # A cancelled request says nothing about upstream, so it must not shrink the window
+            slot.cancelled = True
+            raise
+        finally:
+            self.release(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'window': round(self.window, 2),
+                'minWindow': self.min_window,
+                'maxWindow': self.max_window,
+                'inFlight': self._in_flight,
+                'queued': self._queued,
+                'retryAfterRemaining': round(max(0.0, self._blocked_until - time.monotonic()), 2),
+                'baselineLatencies': {url_class: round(latency, 4) for url_class, latency in self._baselines.items()},
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'throttled': self.throttled,
+            }
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
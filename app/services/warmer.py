@@ -0,0 +1,181 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, time as day_time
+from typing import Any, Callable, Dict, List
+
+from app.services.cache import cache_bypass
+from app.services.constants import Constants
+from app.services.fetch_content import resolve_today_href_from_landing, today_href_for_date, \
+    week_start_from_today_href, navigation_now
+from app.services.weekly_payloads import get_pub_w_week_json, get_week_program_json, get_weekly_scripture_read, \
+    get_scripture_read_references
+
+logger = logging.getLogger('warmer')
+
+
+def parse_schedule(schedule: str) -> List[day_time]:
+    times = []
+    for entry in schedule.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            times.append(datetime.strptime(entry, '%H:%M').time())
+        except ValueError:
+            logger.warning(f"Ignoring invalid warmer schedule entry: {entry}")
+    return sorted(times)
+
+
+class Warmer:
+    """
+    Precomputes the weekly payloads into the payload cache at startup and at fixed times of day, so the first request
+    after the weekly rollover is served warm.
+
+    Every run bypasses payload cache lookups, so it recomputes payloads that are already cached. Pages and tooltip
+    references still come from their own caches, which expire on their own day/week boundaries.
+    """
+
+    def __init__(self, schedule: List[day_time], prefetch_next_week: bool = False, run_on_startup: bool = True):
+        self.schedule = schedule
+        self.prefetch_next_week = prefetch_next_week
+        self.run_on_startup = run_on_startup
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_run: Dict[str, Any] | None = None
+        self._next_run_at: datetime | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name='payload-warmer', daemon=True)
+        self._thread.start()
+        logger.info(f"Warmer started (schedule={[t.strftime('%H:%M') for t in self.schedule]}, "
+                    f"prefetch_next_week={self.prefetch_next_week})")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def next_run_at(self, now: datetime) -> datetime | None:
+        for scheduled in self.schedule:
+            candidate = now.replace(hour=scheduled.hour, minute=scheduled.minute, second=0, microsecond=0)
+            if candidate > now:
+                return candidate
+        if not self.schedule:
+            return None
+        first = self.schedule[0]
+        return (now + timedelta(days=1)).replace(hour=first.hour, minute=first.minute, second=0, microsecond=0)
+
+    def _loop(self) -> None:
+        if self.run_on_startup:
+            self.run_once()
+        while not self._stop.is_set():
+            now = navigation_now()
+            self._next_run_at = self.next_run_at(now)
+            if self._next_run_at is None:
+                return
+            if self._stop.wait((self._next_run_at - now).total_seconds()):
+                return
+            self.run_once()
+
+    def _week_targets(self) -> tuple[List[tuple[str, str]], str | None]:
+        today_href, status_code = resolve_today_href_from_landing()
+        if status_code != 200:
+            return [], f'Unable to resolve today href: {today_href}'
+
+        targets = [('thisWeek', today_href)]
+        if self.prefetch_next_week:
+            week_start = week_start_from_today_href(today_href)
+            next_week_href = today_href_for_date(today_href, week_start + timedelta(days=7)) if week_start else None
+            if next_week_href:
+                targets.append(('nextWeek', next_week_href))
+            else:
+                logger.warning(f"Unable to derive next week's href from {today_href}")
+        return targets, None
+
+    def run_once(self) -> Dict[str, Any]:
+        with self._lock:
+            if self._running:
+                logger.info("Warmer run already in progress, skipping")
+                return self._last_run or {}
+            self._running = True
+
+        started_at = time.time()
+        logger.info("Warming weekly payloads")
+        weeks = {}
+        error = None
+        try:
+            with cache_bypass(names=('payload',)):
+                targets, error = self._week_targets()
+                for label, today_href in targets:
+                    weeks[label] = self._warm_week(today_href)
+        except Exception as e:
+            logger.error(f"Warmer run failed: {e}")
+            error = str(e)
+        finally:
+            finished_at = time.time()
+            last_run = {
+                'startedAt': datetime.fromtimestamp(started_at).astimezone().isoformat(),
+                'finishedAt': datetime.fromtimestamp(finished_at).astimezone().isoformat(),
+                'durationSeconds': round(finished_at - started_at, 3),
+                'error': error,
+                'weeks': weeks,
+            }
+            with self._lock:
+                self._last_run = last_run
+                self._running = False
+
+        logger.info(f"Weekly payloads warmed in {last_run['durationSeconds']:.2f} seconds")
+        return last_run
+
+    def _warm_week(self, today_href: str) -> Dict[str, Any]:
+        payloads = {'todayHref': today_href}
+
+        def warm(name: str, compute: Callable[[], tuple[Any, int]]) -> Any:
+            start_time = time.time()
+            payload, status_code = compute()
+            payloads[name] = {'status': status_code, 'durationSeconds': round(time.time() - start_time, 3)}
+            if status_code != 200:
+                logger.warning(f"Warming {name} for {today_href} failed with status {status_code}: {payload}")
+                return None
+            return payload
+
+        warm('pubWWeekJson', lambda: get_pub_w_week_json(today_href))
+        warm('weekProgramJson', lambda: get_week_program_json(today_href))
+        weekly_read = warm('weeklyScriptureRead', lambda: get_weekly_scripture_read(today_href))
+        if weekly_read and weekly_read.get('links'):
+            warm('scriptureReadReferences', lambda: get_scripture_read_references(weekly_read['links']))
+        return payloads
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': True,
+                'running': self._running,
+                'schedule': [t.strftime('%H:%M') for t in self.schedule],
+                'prefetchNextWeek': self.prefetch_next_week,
+                'nextRunAt': self._next_run_at.isoformat() if self._next_run_at else None,
+                'lastRun': self._last_run,
+            }
+
+
+_warmer: Warmer | None = None
+
+
+def start_warmer() -> Warmer:
+    global _warmer
+
+    if _warmer is None:
+        _warmer = Warmer(
+            schedule=parse_schedule(Constants.WARMER_SCHEDULE),
+            prefetch_next_week=Constants.WARMER_PREFETCH_NEXT_WEEK,
+            run_on_startup=Constants.WARMER_RUN_ON_STARTUP,
+        )
+        _warmer.start()
+    return _warmer
+
+
+def get_warmer_status() -> Dict[str, Any]:
+    if _warmer is None:
+        return {'enabled': False}
+    return _warmer.status()
@@ -0,0 +1,323 @@
+import logging
+import time
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List
+from urllib.parse import urlparse
+
+from app.services.archive import archived_payload, archive_or_reuse
+from app.services.cache import TTLCache, MISSING
+from app.services.concurrency import bounded_map
+from app.services.constants import Constants
+from app.services.fetch_content import resolve_today_href_from_landing, fetch_today_document_for_href, \
+    fetch_weekly_document, week_start_from_today_href, end_of_week, get_html_content, today_href_for_date, \
+    is_url_str_in_wol_jw_org
+from app.services.html_parser import HtmlDocument
+from app.services.pub_mwb_parser import parse_meeting_workbook_from_soup, parse_weekly_bible_read_from_soup, \
+    extract_references_from_links
+from app.services.pub_w_parser import parse_article_from_soup
+from app.services.reference_link_parser import ReferenceBatch, run_in_reference_batch, track_unresolved_references
+
+logger = logging.getLogger('weekly_payloads')
+
+PUB_W_WEEK_JSON = 'pub-w-week-json'
+WEEK_PROGRAM_JSON = 'pub-mwb-week-program-json'
+WEEKLY_SCRIPTURE_READ = 'pub-mwb-weekly-scripture-read'
+SCRIPTURE_READ_REFERENCES = 'pub-mwb-scripture-read-references'
+
+# Computed endpoint payloads. Week-scoped payloads are keyed by the Monday of their week and kept until the week ends,
+# so a payload precomputed for next week is still there when the week rolls over.
+payload_cache = TTLCache('payload', max_entries=Constants.PAYLOAD_CACHE_MAX_ENTRIES, ttl=Constants.PAYLOAD_CACHE_TTL)
+# Payloads of arbitrary caller-supplied URLs, kept apart so a stream of distinct URLs cannot evict the week payloads the
+# warmer precomputed
+url_payload_cache = TTLCache('url-payload', max_entries=Constants.URL_PAYLOAD_CACHE_MAX_ENTRIES,
+                             ttl=Constants.PAYLOAD_CACHE_TTL)
+
+
+def _cached_payload(key: tuple, build: Callable[[], tuple[Any, int]], expires_at: float | None = None,
+                    cache: TTLCache = payload_cache) -> tuple[Any, int]:
+    """
+    Serves key from cache (the payload cache by default) or builds it. A payload built with unresolved references is
+    only kept for DEGRADED_PAYLOAD_TTL seconds, so it is rebuilt soon instead of being served until the week ends.
+    """
+    cached = cache.get(key)
+    if cached is not MISSING:
+        logger.debug(f"Serving {key} from {cache.name} cache")
+        return cached, 200
+
+    with track_unresolved_references() as unresolved:
+        payload, status_code = build()
+    if status_code == 200:
+        if unresolved.count:
+            logger.warning(f"{key} has {unresolved.count} unresolved references, caching it for "
+                           f"{Constants.DEGRADED_PAYLOAD_TTL}s only")
+            degraded_until = time.time() + Constants.DEGRADED_PAYLOAD_TTL
+            expires_at = degraded_until if expires_at is None else min(expires_at, degraded_until)
+        cache.set(key, payload, expires_at=expires_at)
+    return payload, status_code
+
+
+def _href_language(today_href: str) -> str:
+    return today_href.split('/')[1] if today_href.count('/') > 1 else ''
+
+
+def _week_key(today_href: str) -> tuple[str, str, float | None]:
+    """
+    Returns the (week, language, expires_at) a payload of today_href is cached under. The language is part of the key
+    since any WOL week URL can be requested: an English week must not be served for the default Spanish one.
+    """
+    week_start = week_start_from_today_href(today_href)
+    if week_start is None:
+        return today_href, _href_language(today_href), None
+    return week_start.isoformat(), _href_language(today_href), end_of_week(week_start)
+
+
+def _archive_key(today_href: str) -> tuple[str | None, str]:
+    """
+    Returns the (week, language) a today href is archived under; week is None when the href does not end with a date.
+    """
+    week_start = week_start_from_today_href(today_href)
+    return (week_start.isoformat() if week_start else None), _href_language(today_href)
+
+
+def _workbook_source(document: HtmlDocument) -> str:
+    # The today page also carries the daily text, so only the workbook item identifies the week's content
+    workbook_item = document.soup.select_one('.todayItem.pub-mwb')
+    return str(workbook_item) if workbook_item else document.html
+
+
+def _resolve_today_href(today_href: str | None) -> tuple[str, int]:
+    if today_href is not None:
+        return today_href, 200
+    return resolve_today_href_from_landing()
+
+
+def get_pub_w_week_json(today_href: str | None = None) -> tuple[Dict[str, Any] | str, int]:
+    """
+    Returns the parsed study article of the week of today_href (this week when omitted), as served by
+    /pub-w/get-this-week-json.
+    """
+    today_href, status_code = _resolve_today_href(today_href)
+    if status_code != 200:
+        return today_href, status_code
+    week, language, expires_at = _week_key(today_href)
+
+    archive_week, _ = _archive_key(today_href)
+
+    def build() -> tuple[Dict[str, Any] | str, int]:
+        archived = archived_payload(Constants.PUB_CODE_WATCHTOWER, archive_week, language)
+        if archived is not None:
+            return archived['payload'], 200
+
+        today_document, status_code = fetch_today_document_for_href(today_href)
+        if status_code != 200:
+            return today_document, status_code
+        weekly_document, status_code = fetch_weekly_document(today_document)
+        if status_code != 200:
+            return weekly_document, status_code
+        return archive_or_reuse(Constants.PUB_CODE_WATCHTOWER, archive_week, language, Constants.BASE_URL + today_href,
+                                weekly_document.html, lambda: parse_article_from_soup(weekly_document.soup)), 200
+
+    return _cached_payload((PUB_W_WEEK_JSON, week, language), build, expires_at)
+
+
+def get_pub_w_json_for_url(url: str) -> tuple[Dict[str, Any] | str, int]:
+    archive_week, language = _archive_key(urlparse(url).path)
+
+    def build() -> tuple[Dict[str, Any] | str, int]:
+        archived = archived_payload(Constants.PUB_CODE_WATCHTOWER, archive_week, language)
+        if archived is not None:
+            return archived['payload'], 200
+
+        html_content, status_code = get_html_content(url)
+        if status_code != 200:
+            return html_content, status_code
+        return archive_or_reuse(Constants.PUB_CODE_WATCHTOWER, archive_week, language, url, html_content,
+                                lambda: parse_article_from_soup(HtmlDocument(html=html_content).soup)), 200
+
+    return _cached_payload((PUB_W_WEEK_JSON, url), build, cache=url_payload_cache)
+
+
+def get_week_program_json(today_href: str | None = None) -> tuple[Dict[str, Any] | str, int]:
+    """
+    Returns the parsed meeting workbook of the week of today_href (this week when omitted), as served by
+    /pub-mwb/get-week-program-json.
+    """
+    today_href, status_code = _resolve_today_href(today_href)
+    if status_code != 200:
+        return today_href, status_code
+    week, language, expires_at = _week_key(today_href)
+
+    archive_week, _ = _archive_key(today_href)
+
+    def build() -> tuple[Dict[str, Any] | str, int]:
+        archived = archived_payload(Constants.PUB_CODE_MEETING_WORKBOOK, archive_week, language)
+        if archived is not None:
+            return archived['payload'], 200
+
+        today_document, status_code = fetch_today_document_for_href(today_href)
+        if status_code != 200:
+            return today_document, status_code
+        return archive_or_reuse(Constants.PUB_CODE_MEETING_WORKBOOK, archive_week, language,
+                                Constants.BASE_URL + today_href, _workbook_source(today_document),
+                                lambda: parse_meeting_workbook_from_soup(today_document.soup)), 200
+
+    return _cached_payload((WEEK_PROGRAM_JSON, week, language), build, expires_at)
+
+
+def get_week_program_json_for_url(url: str) -> tuple[Dict[str, Any] | str, int]:
+    archive_week, language = _archive_key(urlparse(url).path)
+
+    def build() -> tuple[Dict[str, Any] | str, int]:
+        archived = archived_payload(Constants.PUB_CODE_MEETING_WORKBOOK, archive_week, language)
+        if archived is not None:
+            return archived['payload'], 200
+
+        html_content, status_code = get_html_content(url)
+        if status_code != 200:
+            return html_content, status_code
+        document = HtmlDocument(html=html_content)
+        return archive_or_reuse(Constants.PUB_CODE_MEETING_WORKBOOK, archive_week, language, url,
+                                _workbook_source(document),
+                                lambda: parse_meeting_workbook_from_soup(document.soup)), 200
+
+    return _cached_payload((WEEK_PROGRAM_JSON, url), build, cache=url_payload_cache)
+
+
+def get_weekly_scripture_read(today_href: str | None = None) -> tuple[Dict[str, Any] | str, int]:
+    """
+    Returns the Bible reading assignment of the week of today_href (this week when omitted), as served by
+    /pub-mwb/weekly-scripture-read.
+    """
+    today_href, status_code = _resolve_today_href(today_href)
+    if status_code != 200:
+        return today_href, status_code
+    week, language, expires_at = _week_key(today_href)
+
+    def build() -> tuple[Dict[str, Any] | str, int]:
+        today_document, status_code = fetch_today_document_for_href(today_href)
+        if status_code != 200:
+            return today_document, status_code
+        return parse_weekly_bible_read_from_soup(today_document.soup), 200
+
+    return _cached_payload((WEEKLY_SCRIPTURE_READ, week, language), build, expires_at)
+
+
+def get_scripture_read_references(links: List[str]) -> tuple[Dict[str, Any], int]:
+    """
+    Returns the references of the given chapter links, as served by /pub-mwb/scripture-read-references. Results with
+    errors are not cached, so the failing chapters are retried on the next call.
+    """
+    cache_key = (SCRIPTURE_READ_REFERENCES, tuple(links))
+    cached = payload_cache.get(cache_key)
+    if cached is not MISSING:
+        return cached, 200
+
+    bible_references = extract_references_from_links(links)
+    if not bible_references['errors']:
+        payload_cache.set(cache_key, bible_references)
+    return bible_references, 200
+
+
+def _parse_date(value: str, name: str) -> tuple[date | str, int]:
+    try:
+        return date.fromisoformat(value), 200
+    except ValueError:
+        return f'{name} must be a date in YYYY-MM-DD format', 400
+
+
+def resolve_week_sources(start: str | None, end: str | None, urls: List[str]) -> tuple[List[Dict[str, Any]] | str, int]:
+    """
+    Turns the input of a multi-week request into the weeks to resolve: either every week from start to end
+    (YYYY-MM-DD, both inclusive; end defaults to start) or the given week URLs, which are either today pages
+    (.../wol/h/.../<year>/<month>/<day>) or the pages to parse directly.
+
+    Returns:
+    tuple[List[Dict[str, Any]] | str, int]: One {'week', 'url', 'todayHref'} entry per week, in order, or an error
+        message and status code (400 for invalid input).
+    """
+    if bool(start) == bool(urls):
+        return 'Provide either a from date (and optionally a to date) or a list of week urls', 400
+
+    if urls:
+        invalid_urls = [url for url in urls if not is_url_str_in_wol_jw_org(url)]
+        if invalid_urls:
+            return f'Some urls are invalid: {invalid_urls}', 400
+        sources = []
+        for url in urls:
+            path = urlparse(url).path
+            week_start = week_start_from_today_href(path)
+            sources.append({
+                'week': week_start.isoformat() if week_start else None,
+                'url': url,
+                'todayHref': path if week_start else None,
+            })
+    else:
+        start_date, status_code = _parse_date(start, 'from')
+        if status_code != 200:
+            return start_date, status_code
+        end_date, status_code = _parse_date(end, 'to') if end else (start_date, 200)
+        if status_code != 200:
+            return end_date, status_code
+        if end_date < start_date:
+            return 'to must not be before from', 400
+
+        today_href, status_code = resolve_today_href_from_landing()
+        if status_code != 200:
+            return today_href, status_code
+        sources = []
+        week_start = start_date - timedelta(days=start_date.weekday())
+        while week_start <= end_date and len(sources) <= Constants.WEEK_BATCH_MAX_WEEKS:
+            week_href = today_href_for_date(today_href, week_start)
+            if week_href is None:
+                return f'Unable to build the href of other weeks from {today_href}', 500
+            sources.append({'week': week_start.isoformat(), 'url': Constants.BASE_URL + week_href,
+                            'todayHref': week_href})
+            week_start += timedelta(days=7)
+
+    if len(sources) > Constants.WEEK_BATCH_MAX_WEEKS:
+        return f'At most {Constants.WEEK_BATCH_MAX_WEEKS} weeks can be requested at once', 400
+    return sources, 200
+
+
+def _get_weeks(sources: List[Dict[str, Any]],
+               get_by_href: Callable[[str], tuple[Any, int]],
+               get_by_url: Callable[[str], tuple[Any, int]]) -> Dict[str, Any]:
+    # One batch for every week, so a tooltip cited by several weeks is only resolved once
+    batch = ReferenceBatch()
+
+    def resolve(source: Dict[str, Any]) -> Dict[str, Any]:
+        week = {'week': source['week'], 'url': source['url']}
+        try:
+            if source['todayHref'] is not None:
+                payload, status_code = get_by_href(source['todayHref'])
+            else:
+                payload, status_code = get_by_url(source['url'])
+        except Exception as e:
+            logger.exception(f"Failed to resolve week {source['url']}")
+            payload, status_code = str(e), 500
+        week['status'] = status_code
+        week['result' if status_code == 200 else 'error'] = payload
+        return week
+
+    weeks = bounded_map(lambda source: run_in_reference_batch(batch, resolve, source), sources,
+                        Constants.WEEK_BATCH_WORKERS)
+    return {
+        'weeks': weeks,
+        'fetchStats': batch.stats(),
+    }
+
+
+def get_pub_w_weeks_json(sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns the parsed study articles of several weeks (see resolve_week_sources), resolved in parallel. Each week
+    carries its own status and either its 'result' or its 'error'.
+    """
+    return _get_weeks(sources, get_pub_w_week_json, get_pub_w_json_for_url)
+
+
+def get_weeks_program_json(sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Returns the parsed meeting workbooks of several weeks (see resolve_week_sources), resolved in parallel. Each week
+    carries its own status and either its 'result' or its 'error'.
+    """
+    return _get_weeks(sources, get_week_program_json, get_week_program_json_for_url)
@@ -0,0 +1,226 @@
+"""
+Benchmarks the parsers over the WOL stub fixtures with every upstream request answered in-process.
+
+Usage:
+    python -m benchmarks.parsers [--filter pub_mwb] [--save-baseline] [--threshold 0.25] [--memory-threshold 0.1]
+
+Reports the best and median time per call and the peak traced memory of one call for each case. With --save-baseline
+the results are written to the baseline file; otherwise they are compared against it and the command exits with
+status 1 when a case got slower (or allocates more) than the baseline by more than the threshold, and with status 2
+when there is no baseline to compare with (missing, or recorded with another backend).
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from app.services import response_store
+from app.services.cache import cache_bypass
+from app.services.constants import Constants
+from app.services.general_reference_parsers import PUB_W_STRATEGY, PUB_NWTSTY_STRATEGY, DEFAULT_STRATEGY
+from app.services.html_parser import get_parser_backend, use_parser_backend
+from app.services.http_client import get_session
+from app.services.pub_mwb_parser import parse_meeting_workbook_to_json, parse_bible_reference, \
+    parse_10min_talk_to_json
+from app.services.pub_w_parser import parse_html_to_json
+from app.services.reference_link_parser import validate_and_parse_potential_reference_json, \
+    apply_specific_reference_data_parsing
+from wol_stub.server import FIXTURES_DIR, Fixtures, create_stub_app
+
+DEFAULT_BASELINE = Path(__file__).parent / 'baselines' / 'parsers.json'
+
+
+class FixtureAdapter(BaseAdapter):
+    """
+    Answers every request from the WOL stub app in-process, so no benchmark touches the network. Responses are
+    memoized per path, which keeps the stub's own cost out of the measurements after the warm-up call.
+    """
+
+    def __init__(self, fixtures_dir: Path):
+        super().__init__()
+        self._client = create_stub_app(fixtures_dir=fixtures_dir).test_client()
+        self._responses: Dict[str, tuple[int, bytes, Dict[str, str]]] = {}
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        path = f'{parts.path}?{parts.query}' if parts.query else parts.path
+        if path not in self._responses:
+            stub_response = self._client.get(path)
+            self._responses[path] = (stub_response.status_code, stub_response.get_data(), dict(stub_response.headers))
+        status_code, body, headers = self._responses[path]
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.reason = 'OK' if status_code < 400 else 'Error'
+        response.headers = CaseInsensitiveDict(headers)
+        response._content = body
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+def stub_network(fixtures_dir: Path) -> None:
+    adapter = FixtureAdapter(fixtures_dir)
+    session = get_session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # The async engine has its own client; the benchmarks exercise the default thread-pool path
+    Constants.FETCH_ENGINE = 'sync'
+    # Nor do they write every fixture response to the shared on-disk store
+    response_store.response_store = None
+    # In-process answers never need hedging, and handing attempts to the hedge threads would skew the timings
+    Constants.UPSTREAM_HEDGE_ENABLED = False
+
+
+def build_cases(fixtures: Fixtures) -> Dict[str, Callable[[], Any]]:
+    weekly_html = fixtures.read('weekly.html')
+    today_html = fixtures.read('today.html')
+    chapter_html = fixtures.render('chapter.html', key='19070', book=19, chapter=70)
+    tooltips = {
+        'bible': fixtures.tooltip('/wol/bc/r4/lp-s/1019070001/0/0'),
+        'watchtower': fixtures.tooltip('/wol/bc/r4/lp-s/1200000101/0/0'),
+        'publication': fixtures.tooltip('/wol/bc/r4/lp-s/1100000303/0/0'),
+        'reading_assignment': fixtures.tooltip('/wol/bc/r4/lp-s/2024241/0/0'),
+    }
+    tooltip_contents = {name: json.loads(body)['items'][0]['content'] for name, body in tooltips.items()}
+
+    cases = {
+        'parse_html_to_json[weekly]': lambda: parse_html_to_json(weekly_html),
+        'parse_meeting_workbook_to_json[today]': lambda: parse_meeting_workbook_to_json(today_html),
+        'parse_10min_talk_to_json[today]': lambda: parse_10min_talk_to_json(today_html),
+        'parse_bible_reference[chapter]': lambda: parse_bible_reference(chapter_html),
+        'PubWParserStrategy[watchtower]': lambda: PUB_W_STRATEGY.parse(tooltip_contents['watchtower']),
+        'PubNwtstyParserStrategy[bible]': lambda: PUB_NWTSTY_STRATEGY.parse(tooltip_contents['bible']),
+        'DefaultParserStrategy[publication]': lambda: DEFAULT_STRATEGY.parse(tooltip_contents['publication']),
+    }
+    for name, body in tooltips.items():
+        cases[f'validate_and_parse_potential_reference_json[{name}]'] = \
+            lambda body=body: validate_and_parse_potential_reference_json(body)
+        # The whole decode of a fetched tooltip, as resolve_reference_data runs it
+        cases[f'decode_reference[{name}]'] = \
+            lambda body=body: apply_specific_reference_data_parsing(validate_and_parse_potential_reference_json(body))
+    return cases
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    # Every cache is bypassed so each call parses and resolves references from scratch
+    with cache_bypass():
+        fn()
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        timings = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak_bytes = tracemalloc.get_traced_memory()[1] - start_bytes
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'best': min(timings),
+        'median': statistics.median(timings),
+        'peakBytes': peak_bytes,
+    }
+
+
+def find_regressions(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                     threshold: float, memory_threshold: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if result['best'] > previous['best'] * (1 + threshold):
+            regressions.append(f"{name}: {previous['best'] * 1000:.3f} ms -> {result['best'] * 1000:.3f} ms")
+        if result['peakBytes'] > previous['peakBytes'] * (1 + memory_threshold):
+            regressions.append(f"{name}: {previous['peakBytes'] / 1024:.1f} KiB -> "
+                               f"{result['peakBytes'] / 1024:.1f} KiB peak")
+    return regressions
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--filter', help='Only run cases whose name contains this substring')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--fixtures', type=Path, default=FIXTURES_DIR,
+                            help='Fixture directory laid out like wol_stub/fixtures, e.g. with recorded pages')
+    arg_parser.add_argument('--backend', default=get_parser_backend(), help='HTML parser backend to benchmark')
+    arg_parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    arg_parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    arg_parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed relative slowdown of the best time per call (0.25 = 25%%)')
+    arg_parser.add_argument('--memory-threshold', type=float, default=0.1,
+                            help='Allowed relative growth of the peak memory per call')
+    args = arg_parser.parse_args()
+
+    stub_network(args.fixtures)
+    cases = build_cases(Fixtures(args.fixtures))
+    if args.filter:
+        cases = {name: fn for name, fn in cases.items() if args.filter in name}
+
+    baseline, baseline_error = {}, None
+    if not args.baseline.exists():
+        baseline_error = f'No baseline at {args.baseline}; record one with --save-baseline'
+    else:
+        stored = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if stored.get('backend') == args.backend:
+            baseline = stored['results']
+        else:
+            baseline_error = f"Baseline was recorded with backend {stored.get('backend')!r}, not {args.backend!r}"
+
+    results = {}
+    name_width = max(len(name) for name in cases)
+    print(f'{"case":<{name_width}} {"best (ms)":>10} {"median (ms)":>11} {"peak (KiB)":>10} {"vs baseline":>11}')
+    with use_parser_backend(args.backend):
+        for name, fn in cases.items():
+            result = measure(fn, args.repeat)
+            results[name] = result
+            change = f"{result['best'] / baseline[name]['best'] - 1:>+11.1%}" if name in baseline else f'{"-":>11}'
+            print(f"{name:<{name_width}} {result['best'] * 1000:>10.3f} {result['median'] * 1000:>11.3f} "
+                  f"{result['peakBytes'] / 1024:>10.1f} {change}")
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            'backend': args.backend,
+            'python': platform.python_version(),
+            # Cases left out by --filter keep their previous baseline
+            'results': {**baseline, **results},
+        }, indent=2, sort_keys=True), encoding='utf-8')
+        print(f'Baseline saved to {args.baseline}')
+        return
+
+    if baseline_error:
+        print(f'{baseline_error}; nothing was compared', file=sys.stderr)
+        sys.exit(2)
+    missing = [name for name in results if name not in baseline]
+    if missing:
+        print(f"No baseline for {', '.join(missing)}; record them with --save-baseline", file=sys.stderr)
+
+    regressions = find_regressions(results, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print('Regressions beyond the threshold:', file=sys.stderr)
+        for regression in regressions:
+            print(f'  {regression}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
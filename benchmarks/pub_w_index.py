@@ -0,0 +1,66 @@
+"""
+Compares the per-question data-rel-pid scan against the single-pass paragraph index on synthetic long articles.
+
+Usage:
+    python -m benchmarks.pub_w_index [--questions 50 100 200 400] [--repeat 5]
+"""
+import argparse
+import time
+
+from app.services.html_parser import make_soup
+from app.services.pub_w_parser import index_article_paragraphs
+
+
+def build_article(questions: int, paragraphs_per_question: int = 2) -> str:
+    parts = ['<article id="article">']
+    for q in range(1, questions + 1):
+        parts.append(f'<p class="qu" data-pid="{q * 10}"><strong>{q}.</strong> Question {q}?</p>')
+        for p in range(paragraphs_per_question):
+            parts.append(f'<p class="p{p}" data-rel-pid="[{q * 10}]">Paragraph {q}.{p} <a href="#">ref</a></p>')
+        parts.append('<div><p>Unrelated paragraph</p></div>')
+    parts.append('</article>')
+    return ''.join(parts)
+
+
+def lookup_with_scan(soup) -> int:
+    found = 0
+    for question in soup.find_all('p', class_='qu'):
+        found += len(soup.find_all('p', {'data-rel-pid': f'[{question.get("data-pid")}]'}))
+    return found
+
+
+def lookup_with_index(soup) -> int:
+    article_index = index_article_paragraphs(soup)
+    found = 0
+    for question in article_index['questions']:
+        found += len(article_index['paragraphsByRelPid'].get(f'[{question.get("data-pid")}]', []))
+    return found
+
+
+def best_of(fn, soup, repeat: int) -> tuple[float, int]:
+    timings = []
+    result = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(soup)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--questions', nargs='+', type=int, default=[25, 50, 100, 200, 400])
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    print(f'{"questions":>9} {"scan (ms)":>10} {"index (ms)":>10} {"speedup":>8}')
+    for questions in args.questions:
+        soup = make_soup(build_article(questions))
+        scan_time, scan_found = best_of(lookup_with_scan, soup, args.repeat)
+        index_time, index_found = best_of(lookup_with_index, soup, args.repeat)
+        assert scan_found == index_found
+        print(f'{questions:>9} {scan_time * 1000:>10.2f} {index_time * 1000:>10.2f} {scan_time / index_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
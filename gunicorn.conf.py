@@ -0,0 +1,6 @@
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drops the live gauges of a dead worker; its counters and histograms keep counting towards the totals
+    multiprocess.mark_process_dead(worker.pid)
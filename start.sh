@@ -1,2 +1,6 @@
 #!/bin/sh
-exec gunicorn -w 4 -k gevent --timeout 60 -b 0.0.0.0:"${PORT}" wsgi:app
+# Every worker writes its metrics here so /metrics can aggregate them; stale files from a previous run would double count
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus-multiproc}"
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
+exec gunicorn -c gunicorn.conf.py -w 4 -k gevent --timeout 60 -b 0.0.0.0:"${PORT}" wsgi:app
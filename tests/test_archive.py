@@ -0,0 +1,17 @@
+from app.services.archive import WeekArchive, content_hash
+from app.services.constants import Constants
+
+
+def test_creates_missing_parent_directory(tmp_path):
+    path = tmp_path / 'data' / 'nested' / 'archive.sqlite3'
+    archive = WeekArchive(str(path), refresh_interval=60)
+    source_url = 'https://wol.jw.org/es/wol/d/r4/lp-s/202024201'
+    source = '<html>week</html>'
+
+    archive.put(Constants.PUB_CODE_MEETING_WORKBOOK, '2024-06-10', 'es', source_url, content_hash(source),
+                {'weekDateSpan': '10-16 de junio'})
+
+    assert path.exists()
+    entry = archive.get(Constants.PUB_CODE_MEETING_WORKBOOK, '2024-06-10', 'es')
+    assert entry['payload'] == {'weekDateSpan': '10-16 de junio'}
+    assert entry['sourceHash'] == content_hash(source)
@@ -0,0 +1,15 @@
+from app.services.response_store import DEFAULT_TTLS, ResponseStore
+
+TOOLTIP_URL = 'https://wol.jw.org/es/wol/bc/r4/lp-s/1102024241/0/0'
+
+
+def test_creates_missing_parent_directory(tmp_path):
+    path = tmp_path / 'data' / 'nested' / 'responses.sqlite3'
+    store = ResponseStore(str(path), max_bytes=1024 * 1024, ttls=DEFAULT_TTLS)
+
+    store.put(TOOLTIP_URL, '{"items": []}', etag='"v1"', last_modified=None)
+
+    assert path.exists()
+    entry = store.get(TOOLTIP_URL)
+    assert entry['body'] == '{"items": []}'
+    assert entry['etag'] == '"v1"'
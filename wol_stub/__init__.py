@@ -0,0 +1 @@
+from wol_stub.server import create_stub_app, load_faults
@@ -0,0 +1,23 @@
+import argparse
+import logging
+from datetime import date
+
+from wol_stub.server import create_stub_app, load_faults
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded WOL fixtures with configurable latency and faults.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3101)
+    parser.add_argument('--faults', help='Path to a JSON fault profile (see wol_stub/faults.example.json)')
+    parser.add_argument('--seed', type=int, help='Seed for latency and fault sampling, for reproducible runs')
+    parser.add_argument('--today', type=date.fromisoformat, help='Date the home page links as today (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_stub_app(load_faults(args.faults), seed=args.seed, today=args.today)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
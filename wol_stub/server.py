@@ -0,0 +1,176 @@
+import json
+import logging
+import random
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict
+
+from flask import Flask, Response, abort, request
+
+logger = logging.getLogger('wol_stub')
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+ROUTE_CLASSES = ('landing', 'today', 'article', 'chapter', 'tooltip')
+
+# A client read timeout is 27s, so hanging a little longer than that reliably surfaces as a timeout
+DEFAULT_HANG_MS = 30000
+
+
+def load_faults(path: str | None) -> Dict[str, Dict[str, Any]]:
+    """
+    Loads the per-route fault profile. Keys are route classes (see ROUTE_CLASSES) plus an optional `default`
+    applied to classes without their own entry. Each profile accepts:
+
+    - latencyMs: fixed delay, or a [min, max] range sampled uniformly, before the response starts
+    - errorRate / errorStatus / retryAfter: fraction of requests answered with errorStatus (503 by default),
+      optionally carrying a Retry-After header
+    - timeoutRate / hangMs: fraction of requests that hang for hangMs before answering
+    - slowBodyMs / chunkSize: stream the body in chunkSize-byte chunks, sleeping slowBodyMs between chunks
+    """
+    if not path:
+        return {}
+    with open(path, encoding='utf-8') as fp:
+        faults = json.load(fp)
+    unknown = set(faults) - set(ROUTE_CLASSES) - {'default'}
+    if unknown:
+        raise ValueError(f"Unknown route classes in fault profile: {sorted(unknown)}")
+    return faults
+
+
+class FaultInjector:
+    def __init__(self, faults: Dict[str, Dict[str, Any]], seed: int | None = None):
+        self.faults = faults
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def profile(self, route_class: str) -> Dict[str, Any]:
+        return self.faults.get(route_class, self.faults.get('default', {}))
+
+    def _sample(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def _latency_seconds(self, latency_ms) -> float:
+        if isinstance(latency_ms, (list, tuple)):
+            low, high = latency_ms
+            return (low + (high - low) * self._sample()) / 1000
+        return (latency_ms or 0) / 1000
+
+    def before_response(self, route_class: str):
+        profile = self.profile(route_class)
+
+        delay = self._latency_seconds(profile.get('latencyMs', 0))
+        if delay:
+            time.sleep(delay)
+
+        if self._sample() < profile.get('timeoutRate', 0):
+            time.sleep(profile.get('hangMs', DEFAULT_HANG_MS) / 1000)
+
+        if self._sample() < profile.get('errorRate', 0):
+            headers = {}
+            if profile.get('retryAfter') is not None:
+                headers['Retry-After'] = str(profile['retryAfter'])
+            abort(Response('Injected fault', status=profile.get('errorStatus', 503), headers=headers))
+
+    def make_response(self, route_class: str, body: str, mimetype: str) -> Response:
+        profile = self.profile(route_class)
+        slow_body_ms = profile.get('slowBodyMs', 0)
+        if not slow_body_ms:
+            response = Response(body, mimetype=mimetype)
+            response.add_etag()
+            return response.make_conditional(request)
+
+        encoded = body.encode('utf-8')
+        chunk_size = profile.get('chunkSize', 1024)
+
+        def generate():
+            for start in range(0, len(encoded), chunk_size):
+                if start:
+                    time.sleep(slow_body_ms / 1000)
+                yield encoded[start:start + chunk_size]
+
+        return Response(generate(), mimetype=mimetype)
+
+
+class Fixtures:
+    def __init__(self, fixtures_dir: Path = FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        self._files: Dict[str, str] = {}
+        self.tooltip_index = json.loads(self.read('tooltips/index.json'))
+
+    def read(self, name: str) -> str:
+        if name not in self._files:
+            self._files[name] = (self.fixtures_dir / name).read_text(encoding='utf-8')
+        return self._files[name]
+
+    def render(self, name: str, **values) -> str:
+        html = self.read(name)
+        for key, value in values.items():
+            html = html.replace('{{' + key + '}}', str(value))
+        return html
+
+    def tooltip(self, path: str) -> str:
+        index = self.tooltip_index
+        name = index['paths'].get(path)
+        if name is None:
+            name = next((file for prefix, file in index['prefixes'] if path.startswith(prefix)), index['default'])
+        values = {}
+        # Bible citations encode book, chapter and verse in the document id: 10 + BB + CCC + VVV
+        document_id = path.split('/')[5] if path.count('/') >= 5 else ''
+        if name == 'bible.json' and len(document_id) == 10 and document_id.isdigit():
+            values = {
+                'book': int(document_id[2:4]),
+                'chapter': int(document_id[4:7]),
+                'verse': int(document_id[7:10]),
+            }
+        return self.render(f'tooltips/{name}', **values)
+
+
+def create_stub_app(faults: Dict[str, Dict[str, Any]] | None = None, seed: int | None = None,
+                    today: date | None = None, fixtures_dir: Path = FIXTURES_DIR) -> Flask:
+    """
+    Builds a Flask app serving the fixtures at the same paths fetch_content and reference_link_parser request from
+    wol.jw.org. Point the service at it with WOL_BASE_URL.
+    """
+    app = Flask(__name__)
+    fixtures = Fixtures(fixtures_dir)
+    injector = FaultInjector(faults or {}, seed=seed)
+
+    @app.route('/')
+    def landing():
+        injector.before_response('landing')
+        return injector.make_response('landing', fixtures.read('landing.html'), 'text/html')
+
+    @app.route('/<lang>/wol/h/<rsconf>/<lib>')
+    def home(lang, rsconf, lib):
+        injector.before_response('landing')
+        day = today or date.today()
+        html = fixtures.render('home.html', year=day.year, month=day.month, day=day.day)
+        return injector.make_response('landing', html, 'text/html')
+
+    @app.route('/<lang>/wol/h/<rsconf>/<lib>/<int:year>/<int:month>/<int:day>')
+    def today_page(lang, rsconf, lib, year, month, day):
+        injector.before_response('today')
+        return injector.make_response('today', fixtures.read('today.html'), 'text/html')
+
+    @app.route('/<lang>/wol/d/<rsconf>/<lib>/<document_id>')
+    def article(lang, rsconf, lib, document_id):
+        injector.before_response('article')
+        return injector.make_response('article', fixtures.read('weekly.html'), 'text/html')
+
+    @app.route('/<lang>/wol/b/<rsconf>/<lib>/<pub>/<int:book>/<int:chapter>')
+    def chapter(lang, rsconf, lib, pub, book, chapter):
+        injector.before_response('chapter')
+        html = fixtures.render('chapter.html', key=f'{book}{chapter:03d}', book=book, chapter=chapter)
+        return injector.make_response('chapter', html, 'text/html')
+
+    @app.route('/wol/bc/<path:rest>')
+    def tooltip(rest):
+        injector.before_response('tooltip')
+        return injector.make_response('tooltip', fixtures.tooltip(request.path), 'application/json')
+
+    logger.info(f"WOL stub serving fixtures from {fixtures.fixtures_dir}")
+    return app